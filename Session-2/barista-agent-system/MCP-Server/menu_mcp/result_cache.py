@@ -0,0 +1,84 @@
+import asyncio
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable
+from collections.abc import Callable
+from typing import Any
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class QueryResultCache:
+    """
+    TTL cache for search results, keyed by normalised query and index version.
+
+    Identical queries that arrive while the first one is still running share its
+    backend call (single-flight) instead of starting their own.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple, tuple[float, Any]] = OrderedDict()
+        self._in_flight: dict[tuple, asyncio.Task] = {}
+        self._counters = {"hits": 0, "misses": 0, "merged": 0, "evictions": 0}
+
+    async def get_or_compute(
+        self,
+        query: str,
+        version: Any,
+        compute: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """
+        Returns the cached result for the query, or computes it once.
+
+        Args:
+            query (str): The normalised query.
+            version (Any): The version of the index the result comes from.
+            compute (Callable[[], Awaitable[Any]]): Computes the result on a miss.
+
+        Returns:
+            Any: The result of the query.
+        """
+        key = (query, version)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            return entry[1]
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self._counters["merged"] += 1
+            return await asyncio.shield(task)
+
+        self._counters["misses"] += 1
+        task = asyncio.ensure_future(compute())
+        self._in_flight[key] = task
+        try:
+            result = await asyncio.shield(task)
+        finally:
+            self._in_flight.pop(key, None)
+
+        self._remember(key, result)
+        return result
+
+    def stats(self) -> dict:
+        lookups = self._counters["hits"] + self._counters["misses"]
+        requests = lookups + self._counters["merged"]
+        return {
+            **self._counters,
+            "entries": len(self._entries),
+            "in_flight": len(self._in_flight),
+            "hit_ratio": self._counters["hits"] / lookups if lookups else 0.0,
+            "merged_ratio": self._counters["merged"] / requests if requests else 0.0,
+        }
+
+    def _remember(self, key: tuple, result: Any) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
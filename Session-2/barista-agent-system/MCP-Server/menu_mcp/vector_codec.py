@@ -0,0 +1,162 @@
+import numpy as np
+from google.cloud.firestore_v1.vector import Vector
+
+INDEX_FORMAT = "int8-mrl256"
+COARSE_DIMENSIONALITY = 256
+QUANTIZATION_LEVELS = 127
+SHORTLIST_FACTOR = 16
+MIN_SHORTLIST_SIZE = 64
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def shortlist_size(limit: int) -> int:
+    return max(limit * SHORTLIST_FACTOR, MIN_SHORTLIST_SIZE)
+
+
+def coarse_vector(embedding: list[float]) -> list[float]:
+    """
+    Returns the Matryoshka prefix of an embedding: its first `COARSE_DIMENSIONALITY`
+    values, normalised again so cosine distances on the prefix stay meaningful.
+    """
+    prefix = np.asarray(embedding[:COARSE_DIMENSIONALITY], dtype=np.float32)
+    return normalize_rows(prefix).tolist()
+
+
+def quantize(embedding: list[float]) -> tuple[np.ndarray, float]:
+    """
+    Quantises an embedding to int8 with a symmetric per-vector scale, so that
+    `codes * scale` approximates the original values.
+
+    Args:
+        embedding (list[float]): The full-precision embedding.
+
+    Returns:
+        tuple[np.ndarray, float]: The int8 codes and the scale.
+    """
+    values = np.asarray(embedding, dtype=np.float32)
+    scale = float(np.abs(values).max()) / QUANTIZATION_LEVELS or 1.0
+    codes = np.clip(np.rint(values / scale), -QUANTIZATION_LEVELS, QUANTIZATION_LEVELS)
+    return codes.astype(np.int8), scale
+
+
+def encode_embedding(embedding: list[float]) -> dict:
+    """
+    Returns the Firestore fields of the compact index format for an embedding: the
+    coarse prefix as a `Vector` for `find_nearest`, and the full embedding as int8
+    bytes with its scale for the rerank.
+    """
+    codes, scale = quantize(embedding)
+    return {
+        "embedding_coarse": Vector(coarse_vector(embedding)),
+        "embedding_q8": codes.tobytes(),
+        "embedding_scale": scale,
+        "index_format": INDEX_FORMAT,
+    }
+
+
+def decode_embedding(data: dict) -> tuple[np.ndarray, float] | None:
+    """
+    Returns the int8 codes and scale stored in a menu document. Documents written
+    before the compact format only have a float `embedding`, which is quantised
+    on the fly.
+    """
+    if data.get("embedding_q8") is not None:
+        codes = np.frombuffer(data["embedding_q8"], dtype=np.int8)
+        return codes, float(data.get("embedding_scale") or 1.0)
+    if data.get("embedding") is not None:
+        return quantize(list(data["embedding"]))
+    return None
+
+
+def top_k(similarities: np.ndarray, limit: int) -> tuple[np.ndarray, np.ndarray]:
+    """Returns the indices and values of the `limit` largest entries of each row."""
+    limit = min(limit, similarities.shape[1])
+    top = np.argpartition(-similarities, limit - 1, axis=1)[:, :limit]
+    top_similarities = np.take_along_axis(similarities, top, axis=1)
+    order = np.argsort(-top_similarities, axis=1)
+    return (
+        np.take_along_axis(top, order, axis=1),
+        np.take_along_axis(top_similarities, order, axis=1),
+    )
+
+
+class QuantizedMatrix:
+    """
+    int8 embedding matrix searched in two stages.
+
+    A coarse pass scores every row on its first `COARSE_DIMENSIONALITY` values only,
+    and the best `shortlist_size(limit)` rows are reranked on the full codes. The
+    coarse prefix is converted to normalised float32 once, when the matrix is
+    built, so a search only converts the codes of its shortlist. The per-vector
+    scale cancels out in a cosine similarity, so only the inverse norms of the
+    full rows are kept next to the codes.
+    """
+
+    def __init__(self, codes: np.ndarray, scales: np.ndarray):
+        self.codes = np.ascontiguousarray(codes, dtype=np.int8)
+        self.scales = np.asarray(scales, dtype=np.float32)
+        self._coarse = np.ascontiguousarray(
+            normalize_rows(self.codes[:, :COARSE_DIMENSIONALITY].astype(np.float32))
+        )
+        self._full_factors = 1.0 / np.maximum(
+            np.linalg.norm(self.codes.astype(np.float32), axis=1), 1e-12
+        ).astype(np.float32)
+
+    @classmethod
+    def from_rows(cls, rows: list[tuple[np.ndarray, float]]) -> "QuantizedMatrix":
+        if not rows:
+            return cls(np.empty((0, 0), dtype=np.int8), np.empty(0, dtype=np.float32))
+        return cls(
+            np.stack([codes for codes, _ in rows]),
+            np.asarray([scale for _, scale in rows], dtype=np.float32),
+        )
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            self.codes.nbytes
+            + self.scales.nbytes
+            + self._coarse.nbytes
+            + self._full_factors.nbytes
+        )
+
+    def search(
+        self, query_vectors: list[list[float]], limit: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the `limit` rows closest to each query vector.
+
+        Args:
+            query_vectors (list[list[float]]): The full-precision query embeddings.
+            limit (int): The number of rows to return per query.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: For each query, the row indices and their
+            cosine similarities, closest first.
+        """
+        queries = normalize_rows(np.asarray(query_vectors, dtype=np.float32))
+        candidates = shortlist_size(limit)
+
+        if candidates >= len(self.codes):
+            # The whole matrix fits in a shortlist, so it is small enough to convert.
+            values = self.codes.astype(np.float32)
+            similarities = (queries @ values.T) * self._full_factors
+            return top_k(similarities, limit)
+
+        coarse_queries = normalize_rows(queries[:, :COARSE_DIMENSIONALITY])
+        shortlist, _ = top_k(coarse_queries @ self._coarse.T, candidates)
+
+        shortlist_codes = self.codes[shortlist].astype(np.float32)
+        similarities = (
+            np.einsum("qd,qkd->qk", queries, shortlist_codes)
+            * self._full_factors[shortlist]
+        )
+        order, top_similarities = top_k(similarities, limit)
+        return np.take_along_axis(shortlist, order, axis=1), top_similarities
@@ -6,9 +6,15 @@ from google.adk.agents import LlmAgent
 
 from .prompts.load_prompts import load_agent_config
 from .tools.common_tools import get_today_date
+from model_tiering import ModelTiering
 from .tools.image_coffee_tools import create_image_coffee
+from .tools.image_coffee_tools import get_image_coffee_job
+from .tools.image_coffee_tools import start_image_coffee_job
 from .tools.promotions_tools import get_current_promotion
+from .tools.promotions_tools import get_promotions_for_dates
+from .tools.promotions_tools import get_week_promotions
 from .tools.menu_tools import get_menu_items
+from head_barista_agent.tools.menu_tools import get_menu_items_batch
 
 client = google.cloud.logging.Client()
 client.setup_logging()
@@ -24,16 +30,25 @@ agent_config = load_agent_config()
 
 print(agent_config)
 
+model_tiering = ModelTiering("creative", LLM_AGENT)
+
 
 creative_director_agent = LlmAgent(
     name="creative_director_agent",
     model=LLM_AGENT,
     description=agent_config["description"],
     instruction=agent_config["instruction"],
+    before_model_callback=model_tiering.before_model,
+    after_model_callback=model_tiering.after_model,
     tools=[
         get_today_date,
         get_current_promotion,
+        get_promotions_for_dates,
+        get_week_promotions,
         create_image_coffee,
+        start_image_coffee_job,
+        get_image_coffee_job,
         get_menu_items,
+        get_menu_items_batch,
     ],
 )
@@ -0,0 +1,186 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+IMAGE_CACHE_PATH = os.getenv(
+    "IMAGE_CACHE_PATH",
+    os.path.join(tempfile.gettempdir(), "image_cache.sqlite3"),
+)
+IMAGE_CACHE_TTL_SECONDS = float(os.getenv("IMAGE_CACHE_TTL_SECONDS", "604800"))
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(1024**3)))
+
+
+def normalize_prompt(prompt: str) -> str:
+    return " ".join(prompt.lower().split())
+
+
+def image_cache_key(model: str, prompt: str) -> str:
+    key = f"{model}\n{normalize_prompt(prompt)}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class ImageCache:
+    """
+    Metadata index of the generated images, kept in a SQLite file.
+
+    Each entry maps a prompt key to the Cloud Storage object of its image. Entries
+    older than `ttl_seconds` are expired, and the least recently used ones are
+    evicted once the images add up to more than `max_bytes`. Expired and evicted
+    object names are returned to the caller, which owns the deletion of the
+    objects.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float, max_bytes: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "storage_hits": 0,
+            "misses": 0,
+            "expirations": 0,
+            "evictions": 0,
+        }
+
+        self._db: sqlite3.Connection | None = None
+        try:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS images ("
+                "key TEXT PRIMARY KEY, object_name TEXT NOT NULL, url TEXT NOT NULL, "
+                "size_bytes INTEGER NOT NULL, created_at REAL NOT NULL, "
+                "last_used REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS images_last_used ON images (last_used)"
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            logging.error(f"Image cache index disabled, {path} is not usable: {e}")
+            self._db = None
+
+    def get(self, key: str) -> tuple[dict | None, list[str]]:
+        """
+        Looks up the image of a prompt key. It counts nothing: the caller counts
+        the hit or miss once it checked that the object still exists.
+
+        Returns:
+            tuple[dict | None, list[str]]: The entry (`object_name`, `url`,
+            `created_at`), or None on a miss, and the objects of expired entries.
+        """
+        with self._lock:
+            if self._db is None:
+                return None, []
+            try:
+                expired = self._expire()
+                row = self._db.execute(
+                    "SELECT object_name, url, created_at FROM images WHERE key = ?",
+                    (key,),
+                ).fetchone()
+                if row is None:
+                    self._db.commit()
+                    return None, expired
+
+                self._db.execute(
+                    "UPDATE images SET last_used = ? WHERE key = ?", (time.time(), key)
+                )
+                self._db.commit()
+                return (
+                    {"object_name": row[0], "url": row[1], "created_at": row[2]},
+                    expired,
+                )
+            except sqlite3.Error as e:
+                logging.error(f"An error occurred reading the image cache index: {e}")
+                return None, []
+
+    def put(
+        self,
+        key: str,
+        object_name: str,
+        url: str,
+        size_bytes: int,
+        created_at: float | None = None,
+    ) -> list[str]:
+        """
+        Records the image of a prompt key.
+
+        Returns:
+            list[str]: The objects of the entries evicted to stay under `max_bytes`.
+        """
+        now = time.time()
+        with self._lock:
+            if self._db is None:
+                return []
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO images (key, object_name, url, size_bytes, "
+                    "created_at, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, object_name, url, size_bytes, created_at or now, now),
+                )
+                evicted = self._evict()
+                self._db.commit()
+                return evicted
+            except sqlite3.Error as e:
+                logging.error(f"An error occurred writing the image cache index: {e}")
+                return []
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if self._db is None:
+                return
+            try:
+                self._db.execute("DELETE FROM images WHERE key = ?", (key,))
+                self._db.commit()
+            except sqlite3.Error as e:
+                logging.error(f"An error occurred writing the image cache index: {e}")
+
+    def count(self, counter: str) -> None:
+        with self._lock:
+            self._counters[counter] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self._counters["hits"] + self._counters["storage_hits"]
+            lookups = hits + self._counters["misses"]
+            return {**self._counters, "hit_ratio": hits / lookups if lookups else 0.0}
+
+    def _expire(self) -> list[str]:
+        rows = self._db.execute(  # type: ignore[union-attr]
+            "SELECT key, object_name FROM images WHERE created_at < ?",
+            (time.time() - self.ttl_seconds,),
+        ).fetchall()
+        self._delete_rows(rows)
+        self._counters["expirations"] += len(rows)
+        return [object_name for _, object_name in rows]
+
+    def _evict(self) -> list[str]:
+        (total,) = self._db.execute(  # type: ignore[union-attr]
+            "SELECT COALESCE(SUM(size_bytes), 0) FROM images"
+        ).fetchone()
+        rows = []
+        if total > self.max_bytes:
+            for key, object_name, size_bytes in self._db.execute(  # type: ignore[union-attr]
+                "SELECT key, object_name, size_bytes FROM images ORDER BY last_used"
+            ).fetchall():
+                if total <= self.max_bytes:
+                    break
+                rows.append((key, object_name))
+                total -= size_bytes
+        self._delete_rows(rows)
+        self._counters["evictions"] += len(rows)
+        return [object_name for _, object_name in rows]
+
+    def _delete_rows(self, rows: list[tuple[str, str]]) -> None:
+        self._db.executemany(  # type: ignore[union-attr]
+            "DELETE FROM images WHERE key = ?", [(key,) for key, _ in rows]
+        )
+
+
+image_cache = ImageCache(
+    IMAGE_CACHE_PATH, IMAGE_CACHE_TTL_SECONDS, IMAGE_CACHE_MAX_BYTES
+)
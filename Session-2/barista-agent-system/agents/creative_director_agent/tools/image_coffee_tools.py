@@ -1,16 +1,26 @@
+import asyncio
+import functools
+import logging
 import os
-import uuid
-from io import BytesIO
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from dotenv import load_dotenv
 from google import genai
 from google.cloud import storage
 from google.genai import types
-from PIL import Image
+from image_variants import get_variant_pool
+from image_variants import ORIGINAL_VARIANT
+from image_variants import render_variants
+from image_variants import variant_object_names
+
+from .image_cache import image_cache
+from .image_cache import image_cache_key
+from .image_jobs import ImageJobQueue
 
 load_dotenv()
 
-MODEL_IMAGEN = os.getenv("MODEL_IMAGEN")
+MODEL_IMAGEN = os.getenv("MODEL_IMAGEN", "")
 
 if not MODEL_IMAGEN:
     raise ValueError("The MODEL_IMAGEN environment variable is not set.")
@@ -25,8 +35,168 @@ BUCKET_NAME = os.getenv("GCS_BUCKET_NAME")
 if not BUCKET_NAME:
     raise ValueError("The GCS_BUCKET_NAME environment variable is not set.")
 
+IMAGE_JOB_MAX_WORKERS = int(os.getenv("IMAGE_JOB_MAX_WORKERS", "4"))
+IMAGE_JOB_MAX_RECORDS = int(os.getenv("IMAGE_JOB_MAX_RECORDS", "256"))
+IMAGE_PLACEHOLDER_URL = os.getenv("IMAGE_PLACEHOLDER_URL")
+IMAGE_UPLOAD_WORKERS = int(os.getenv("IMAGE_UPLOAD_WORKERS", "4"))
+
+
+@functools.cache
+def get_genai_client() -> genai.Client:
+    return genai.Client()
+
+
+@functools.cache
+def get_bucket() -> storage.Bucket:
+    return storage.Client(project=PROJECT_ID).bucket(BUCKET_NAME)
+
+
+@functools.cache
+def get_upload_pool() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(
+        max_workers=IMAGE_UPLOAD_WORKERS, thread_name_prefix="image-upload"
+    )
+
+
+def image_url(object_name: str) -> str:
+    return f"https://storage.googleapis.com/{BUCKET_NAME}/{object_name}"
+
+
+def image_objects(key: str) -> dict[str, str]:
+    return variant_object_names(f"image-{key}")
+
+
+def image_urls(key: str) -> dict[str, str]:
+    return {
+        name: image_url(object_name) for name, object_name in image_objects(key).items()
+    }
+
+
+def delete_images(bucket: storage.Bucket, object_names: list[str]) -> None:
+    """Deletes the images of the given original objects, with all their variants."""
+    for original_name in object_names:
+        prefix = original_name.rsplit("/", 1)[0]
+        for object_name in variant_object_names(prefix).values():
+            try:
+                bucket.blob(object_name).delete()
+            except Exception as e:
+                logging.warning(f"Could not delete expired image {object_name}: {e}")
+
+
+def get_cached_image(bucket: storage.Bucket, key: str) -> dict[str, str] | None:
+    """
+    Returns the URLs of the image already generated for a prompt key, checking the
+    local index first and then whether the original exists in the bucket, e.g.
+    because another instance generated it. The original is uploaded after its
+    variants, so its existence means the variants are there too.
+    """
+    entry, expired = image_cache.get(key)
+    delete_images(bucket, expired)
+
+    original_name = image_objects(key)[ORIGINAL_VARIANT]
+    blob = bucket.get_blob(original_name)
+    if blob is None:
+        if entry is not None:
+            image_cache.delete(key)
+        image_cache.count("misses")
+        return None
+
+    if entry is not None:
+        image_cache.count("hits")
+        return image_urls(key)
+
+    created_at = blob.time_created.timestamp() if blob.time_created else time.time()
+    if time.time() - created_at > image_cache.ttl_seconds:
+        image_cache.count("misses")
+        return None
+
+    image_cache.count("storage_hits")
+    evicted = image_cache.put(
+        key, original_name, image_url(original_name), blob.size or 0, created_at
+    )
+    delete_images(bucket, [name for name in evicted if name != original_name])
+    return image_urls(key)
+
+
+def upload_images(
+    bucket: storage.Bucket,
+    key: str,
+    original: bytes,
+    variants: dict[str, bytes],
+) -> int:
+    """
+    Uploads the WebP variants in parallel, then the PNG original, and returns the
+    number of bytes uploaded.
+    """
+    objects = image_objects(key)
+
+    def upload(name: str, data: bytes, content_type: str) -> None:
+        bucket.blob(objects[name]).upload_from_string(data, content_type=content_type)
+
+    futures = [
+        get_upload_pool().submit(upload, name, data, "image/webp")
+        for name, data in variants.items()
+    ]
+    for future in futures:
+        future.result()
+
+    upload(ORIGINAL_VARIANT, original, "image/png")
+    return len(original) + sum(len(data) for data in variants.values())
 
-def create_image_coffee(coffee_image_prompt: str) -> str | None:
+
+def generate_image(coffee_image_prompt: str) -> dict[str, str] | None:
+    """
+    Returns the URLs of the image of a prompt and of its variants, generating and
+    uploading them unless they are cached. Imagen is asked for a PNG, whose bytes
+    are uploaded as they are; the WebP variants are rendered in the variant
+    process pool, which also converts the original if it is not a PNG.
+    """
+    bucket = get_bucket()
+    key = image_cache_key(MODEL_IMAGEN, coffee_image_prompt)
+    urls = get_cached_image(bucket, key)
+    if urls is not None:
+        logging.info(f"Reusing the cached image {urls[ORIGINAL_VARIANT]}")
+        return urls
+
+    response = get_genai_client().models.generate_images(
+        model=MODEL_IMAGEN,
+        prompt=coffee_image_prompt,
+        config=types.GenerateImagesConfig(
+            number_of_images=1,
+            output_mime_type="image/png",
+        ),
+    )
+
+    if not response.generated_images:
+        return None
+
+    image = response.generated_images[0].image
+    if image is None or not image.image_bytes:
+        return None
+    variants = get_variant_pool().submit(render_variants, image.image_bytes).result()
+    original = variants.pop(ORIGINAL_VARIANT, image.image_bytes)
+
+    logging.info(f"Uploading image and variants to gs://{BUCKET_NAME}/image-{key}/")
+    size_bytes = upload_images(bucket, key, original, variants)
+
+    urls = image_urls(key)
+    logging.info(f"Successfully uploaded to {urls[ORIGINAL_VARIANT]}")
+    original_name = image_objects(key)[ORIGINAL_VARIANT]
+    evicted = image_cache.put(key, original_name, urls[ORIGINAL_VARIANT], size_bytes)
+    delete_images(bucket, [name for name in evicted if name != original_name])
+    return urls
+
+
+def is_image_available(key: str) -> bool:
+    return get_cached_image(get_bucket(), key) is not None
+
+
+image_jobs = ImageJobQueue(
+    generate_image, is_image_available, IMAGE_JOB_MAX_WORKERS, IMAGE_JOB_MAX_RECORDS
+)
+
+
+async def create_image_coffee(coffee_image_prompt: str) -> dict[str, str] | None:
     """
     Generates an image of a coffee based on the provided prompt.
 
@@ -34,40 +204,51 @@ def create_image_coffee(coffee_image_prompt: str) -> str | None:
         coffee_image_prompt (str): The prompt describing the coffee image to generate.
 
     Returns:
-        str | None: The URL or base64 encoded string of the generated image, or None if an error occurs.
+        dict[str, str] | None: The URLs of the generated image by size: "original" (PNG), "full", "medium" and "thumbnail" (WebP), or None if an error occurs. Show the "thumbnail" or "medium" URL and link the larger ones.
     """
     try:
-        client = genai.Client()
+        return await asyncio.to_thread(generate_image, coffee_image_prompt)
 
-        response = client.models.generate_images(
-            model=MODEL_IMAGEN,
-            prompt=coffee_image_prompt,
-            config=types.GenerateImagesConfig(
-                number_of_images=1,
-            ),
-        )
+    except Exception as e:
+        logging.error(f"An error occurred: {e}")
+        return None
 
-        if response.generated_images:
-            image_bytes = response.generated_images[0].image.image_bytes
 
-            image = Image.open(BytesIO(image_bytes))
-            image.save("images/coffee_image.png")
+def start_image_coffee_job(coffee_image_prompt: str) -> dict:
+    """
+    Starts generating an image of a coffee in the background and returns right away. Check it later with `get_image_coffee_job`.
 
-            storage_client = storage.Client(project=PROJECT_ID)
-            bucket = storage_client.bucket(BUCKET_NAME)
+    Args:
+        coffee_image_prompt (str): The prompt describing the coffee image to generate.
 
-            file_name = f"image-{uuid.uuid4()}.png"
-            blob = bucket.blob(file_name)
+    Returns:
+        dict: The job handle (`job_id`), its `status`, the `urls` the image and its variants will have once they are ready and, if configured, a `placeholder_url` to show meanwhile.
+    """
+    try:
+        key = image_cache_key(MODEL_IMAGEN, coffee_image_prompt)
+        job, _ = image_jobs.submit(key, coffee_image_prompt)
+        return {
+            **job,
+            "urls": job.get("urls", image_urls(key)),
+            "placeholder_url": IMAGE_PLACEHOLDER_URL,
+        }
 
-            print(f"Uploading CSV to gs://{BUCKET_NAME}/{file_name}")
-            blob.upload_from_string(image_bytes, content_type="image/png")
+    except Exception as e:
+        logging.error(f"An error occurred: {e}")
+        return {"status": "failed", "error": str(e)}
 
-            url = f"https://storage.googleapis.com/{BUCKET_NAME}/{file_name}"
-            print(f"Successfully uploaded to {url}")
-            return url
 
-        return None
+def get_image_coffee_job(job_id: str) -> dict:
+    """
+    Returns the status of an image job started with `start_image_coffee_job`.
 
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        return None
+    Args:
+        job_id (str): The job handle.
+
+    Returns:
+        dict: The job `status` (pending, running, succeeded or failed), with the image `urls` by size once it succeeded or the `error` if it failed.
+    """
+    job = image_jobs.get(job_id)
+    if job is None:
+        return {"job_id": job_id, "status": "unknown"}
+    return job
@@ -0,0 +1,109 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+class ImageJobQueue:
+    """
+    Runs image generations on a pool of worker threads and keeps their status in
+    memory. Jobs are keyed by the prompt key, so a prompt that is already being
+    generated is merged into the running job instead of starting another one.
+    A succeeded job is reused only while `is_available` confirms its image still
+    exists, since the image cache may have expired or evicted it since. Only the
+    last `max_records` jobs are kept.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[str], dict[str, str] | None],
+        is_available: Callable[[str], bool],
+        max_workers: int,
+        max_records: int,
+    ):
+        self._handler = handler
+        self._is_available = is_available
+        self.max_records = max_records
+        self._jobs: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="image-job"
+        )
+
+    def submit(self, job_id: str, prompt: str) -> tuple[dict, bool]:
+        """
+        Enqueues the generation of an image, unless a job for the same prompt is
+        pending or running, or succeeded and its image is still available.
+
+        Args:
+            job_id (str): The prompt key.
+            prompt (str): The image prompt.
+
+        Returns:
+            tuple[dict, bool]: The job record and whether a new job was created.
+        """
+        with self._lock:
+            stale = self._jobs.get(job_id)
+        # Checking the image reads the bucket, so it runs outside the lock.
+        if stale is not None and (
+            stale["status"] != JOB_SUCCEEDED or self._is_available(job_id)
+        ):
+            stale = None
+
+        with self._lock:
+            record = self._jobs.get(job_id)
+            if (
+                record is not None
+                and record["status"] != JOB_FAILED
+                and record is not stale
+            ):
+                return dict(record), False
+            if stale is not None:
+                logging.info(f"The image of job {job_id} is gone, generating it again")
+
+            record = {
+                "job_id": job_id,
+                "status": JOB_PENDING,
+                "created_at": time.time(),
+            }
+            self._jobs[job_id] = record
+            self._jobs.move_to_end(job_id)
+            while len(self._jobs) > self.max_records:
+                self._jobs.popitem(last=False)
+
+        self._executor.submit(self._run, job_id, prompt)
+        return dict(record), True
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            record = self._jobs.get(job_id)
+            return dict(record) if record else None
+
+    def _update(self, job_id: str, fields: dict) -> None:
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def _run(self, job_id: str, prompt: str) -> None:
+        self._update(job_id, {"status": JOB_RUNNING, "started_at": time.time()})
+        try:
+            urls = self._handler(prompt)
+            if urls is None:
+                raise RuntimeError("No image was generated")
+            self._update(
+                job_id,
+                {"status": JOB_SUCCEEDED, "urls": urls, "finished_at": time.time()},
+            )
+        except Exception as e:
+            logging.error(f"An error occurred in image job {job_id}: {e}")
+            self._update(
+                job_id,
+                {"status": JOB_FAILED, "error": str(e), "finished_at": time.time()},
+            )
@@ -1,22 +1,20 @@
+import logging
 from typing import List
 
-from dotenv import load_dotenv
-from google import genai
-from google.cloud import firestore
-from google.cloud.firestore_v1.base_vector_query import DistanceMeasure
-from google.cloud.firestore_v1.vector import Vector
-from google.genai import types
+from head_barista_agent.tools.embedding_cache import aget_cached_embeddings
+from head_barista_agent.tools.menu_tools import embed_texts
+from head_barista_agent.tools.menu_tools import EMBEDDING_DIMENSIONALITY
+from head_barista_agent.tools.menu_tools import EMBEDDING_TASK_TYPE
+from head_barista_agent.tools.menu_tools import GEMINI_MODEL_EMBEDDING
+from head_barista_agent.tools.menu_tools import lookup_menu_lexical
+from head_barista_agent.tools.menu_tools import MENU_SEARCH_LIMIT
+from head_barista_agent.tools.menu_tools import search_menu
 
-# Carga las variables de entorno desde un archivo .env
-load_dotenv()
+# The menu vector and lexical indexes are the Head Barista's, which runs in the same
+# service, so the menu collection is loaded and watched once per process.
 
-# Constants
-MENU_FIRESTORE_COLLECTION = "menu"
-DATABASE_NAME = "embeddings"
-GEMINI_MODEL_EMBEDDING = "gemini-embedding-001"
 
-
-def get_menu_items(search_query: str) -> List[str]:
+async def get_menu_items(search_query: str) -> List[str]:
     """
     Search the menu database for drinks. 
     Use this to find specific items, categories, or ingredients.
@@ -29,41 +27,25 @@ def get_menu_items(search_query: str) -> List[str]:
     """
 
     try:
-        db = firestore.Client(database=DATABASE_NAME)
-
-        client = genai.Client()
-
-        print("creating embeddings...")
-
-        result = client.models.embed_content(
-            model=GEMINI_MODEL_EMBEDDING,
-            contents=search_query,
-            config=types.EmbedContentConfig(
-                task_type="SEMANTIC_SIMILARITY",
-                output_dimensionality=768,
-            ),
-        )
-
-        embeddings_collection = db.collection(MENU_FIRESTORE_COLLECTION)
-
-        vector_query = embeddings_collection.find_nearest(
-            vector_field="embedding",
-            query_vector=Vector(result.embeddings[0].values),
-            distance_measure=DistanceMeasure.COSINE,
-            limit=2,
-        )
-
-        docs = vector_query.stream()
-        print("Getting menu items...")
-
-        menu_items = []
-
-        for doc in docs:
-            print(doc.get("text_content"))
-            menu_items.append(doc.get("text_content"))
+        match = await lookup_menu_lexical(search_query, MENU_SEARCH_LIMIT)
+        if match:
+            return match[1]
+
+        query_embedding = (
+            await aget_cached_embeddings(
+                [search_query],
+                embed_texts,
+                GEMINI_MODEL_EMBEDDING,
+                EMBEDDING_TASK_TYPE,
+                EMBEDDING_DIMENSIONALITY,
+            )
+        )[0]
+
+        menu_items = await search_menu(query_embedding, MENU_SEARCH_LIMIT)
+        logging.info(f"Found {len(menu_items)} menu items")
 
         return menu_items
 
     except Exception as e:
-        print(f"An error occurred in get_menu_items: {e}")
+        logging.error(f"An error occurred in get_menu_items: {e}")
         return []
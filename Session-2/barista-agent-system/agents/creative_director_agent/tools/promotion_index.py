@@ -0,0 +1,125 @@
+import datetime
+import logging
+import os
+import threading
+
+import yaml  # type: ignore[import-untyped]
+
+WEEKDAYS = [
+    "monday",
+    "tuesday",
+    "wednesday",
+    "thursday",
+    "friday",
+    "saturday",
+    "sunday",
+]
+
+
+def parse_date(value: str) -> datetime.date:
+    """
+    Returns the date of "YYYY-MM-DD" or of a datetime such as "2025-01-31 14:05:00".
+
+    Raises:
+        ValueError: If the value does not start with a valid date.
+    """
+    return datetime.date.fromisoformat(value.strip()[:10])
+
+
+class PromotionIndex:
+    """
+    Promotion campaigns of a YAML file, indexed by weekday and by date.
+
+    Loading resolves the winning campaign of every weekday and of every date
+    covered by a dated campaign, so a lookup is two dict accesses: the date first,
+    then its weekday. The file is reloaded when its mtime changes; a file that
+    fails to load leaves the previous index in place.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime: float | None = None
+        self._by_weekday: dict[int, list[dict]] = {}
+        self._by_date: dict[datetime.date, list[dict]] = {}
+
+    def promotions_on(self, date: datetime.date) -> list[dict]:
+        """
+        Returns the campaigns active on a date, the winning one first.
+
+        Args:
+            date (datetime.date): The date.
+
+        Returns:
+            list[dict]: The `name` and `deal` of every active campaign, by priority.
+        """
+        self.refresh()
+        promotions = self._by_date.get(date)
+        if promotions is None:
+            promotions = self._by_weekday.get(date.weekday(), [])
+        return list(promotions)
+
+    def refresh(self) -> None:
+        """Reloads the index if the promotions file changed since the last load."""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError as e:
+            logging.error(f"Promotions file {self.path} is not readable: {e}")
+            return
+        if mtime == self._mtime:
+            return
+
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            try:
+                self._load()
+            except Exception as e:
+                logging.error(f"An error occurred loading {self.path}: {e}")
+            self._mtime = mtime
+
+    def _load(self) -> None:
+        with open(self.path, "r", encoding="utf-8") as file:
+            config = yaml.safe_load(file) or {}
+
+        weekly: dict[int, list[tuple[int, int, dict]]] = {
+            weekday: [] for weekday in range(len(WEEKDAYS))
+        }
+        dated: dict[datetime.date, list[tuple[int, int, dict]]] = {}
+        for order, campaign in enumerate(config.get("campaigns", [])):
+            promotion = {"name": campaign["name"], "deal": campaign["deal"]}
+            entry = (-int(campaign.get("priority", 0)), order, promotion)
+            weekdays = {
+                WEEKDAYS.index(str(weekday).lower())
+                for weekday in campaign.get("weekdays", WEEKDAYS)
+            }
+
+            if "start_date" not in campaign and "end_date" not in campaign:
+                for weekday in weekdays:
+                    weekly[weekday].append(entry)
+                continue
+
+            start = parse_date(
+                str(campaign.get("start_date", campaign.get("end_date")))
+            )
+            end = parse_date(str(campaign.get("end_date", start)))
+            if end < start:
+                raise ValueError(f"Campaign {campaign['name']} ends before it starts")
+            for offset in range((end - start).days + 1):
+                date = start + datetime.timedelta(days=offset)
+                if date.weekday() in weekdays:
+                    dated.setdefault(date, []).append(entry)
+
+        def resolve(entries: list[tuple[int, int, dict]]) -> list[dict]:
+            return [
+                promotion for _, _, promotion in sorted(entries, key=lambda e: e[:2])
+            ]
+
+        self._by_weekday = {
+            weekday: resolve(entries) for weekday, entries in weekly.items()
+        }
+        self._by_date = {
+            date: resolve(entries + weekly[date.weekday()])
+            for date, entries in dated.items()
+        }
+        logging.info(f"Promotion index loaded from {self.path}")
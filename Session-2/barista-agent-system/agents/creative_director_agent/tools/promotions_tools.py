@@ -1,4 +1,17 @@
 import datetime
+import logging
+import os
+
+from .promotion_index import parse_date
+from .promotion_index import PromotionIndex
+
+PROMOTIONS_FILE = os.getenv(
+    "PROMOTIONS_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "promotions.yaml"),
+)
+MAX_PROMOTION_DATES = 31
+
+promotion_index = PromotionIndex(PROMOTIONS_FILE)
 
 
 def get_current_promotion(date: str) -> dict[str, str] | None:
@@ -11,57 +24,58 @@ def get_current_promotion(date: str) -> dict[str, str] | None:
     Returns:
         dict[str, str] | None: A dictionary describing the current promotion, or None if not found.
     """
+    try:
+        promotions = promotion_index.promotions_on(parse_date(date))
+        return promotions[0] if promotions else None
+    except Exception as e:
+        logging.error(f"An error occurred in get_current_promotion: {e}")
+        return None
+
 
-    # Give more examples from this mock with day of week:
-    promotions = [
-        {
-            "day_of_week": 0,
-            "special": {
-                "name": "Espresso Elixir",
-                "deal": "Get a free pastry with any purchase!",
-            },
-        },
-        {
-            "day_of_week": 1,
-            "special": {
-                "name": "Double Shot Tuesday",
-                "deal": "Earn 2x loyalty points on all espresso drinks today!",
-            },
-        },
-        {
-            "day_of_week": 2,
-            "special": {
-                "name": "Cold Brew Friday",
-                "deal": "Enjoy 20% off all Cold Brews and Nitro coffees.",
-            },
-        },
-        {
-            "day_of_week": 3,
-            "special": {
-                "name": "Morning Combo Deal",
-                "deal": "Buy any large coffee and get a breakfast sandwich for half price.",
-            },
-        },
-        {
-            "day_of_week": 4,
-            "special": {
-                "name": "Double Shot Tuesday",
-                "deal": "Earn 2x loyalty points on all espresso drinks today!",
-            },
-        },
-        {
-            "day_of_week": 5,
-            "special": {
-                "name": "Morning Combo Deal",
-                "deal": "Buy any large coffee and get a breakfast sandwich for half price.",
-            },
-        },
-    ]
+def get_promotions_for_dates(dates: list[str]) -> list[dict]:
+    """
+    Returns the promotion of each of several dates in a single call, e.g. to plan a week of posts.
 
-    day = datetime.datetime.strptime(date, "%Y-%m-%d %H:%M:%S").weekday()
+    Args:
+        dates (list[str]): The dates in "YYYY-MM-DD" format, at most 31.
 
-    for promotion in promotions:
-        if promotion["day_of_week"] == day:
-            return promotion["special"]  # type: ignore[return-value]
+    Returns:
+        list[dict]: One entry per date, in the same order, with its weekday, the winning promotion (or None) and the names of other campaigns running that day.
+    """
+    results = []
+    for date in dates[:MAX_PROMOTION_DATES]:
+        try:
+            day = parse_date(date)
+            promotions = promotion_index.promotions_on(day)
+            results.append(
+                {
+                    "date": day.isoformat(),
+                    "weekday": day.strftime("%A"),
+                    "promotion": promotions[0] if promotions else None,
+                    "also_running": [promotion["name"] for promotion in promotions[1:]],
+                }
+            )
+        except Exception as e:
+            logging.error(f"An error occurred in get_promotions_for_dates: {e}")
+            results.append({"date": date, "error": str(e)})
+    return results
 
-    return None
+
+def get_week_promotions(start_date: str) -> list[dict]:
+    """
+    Returns the promotions of the seven days starting on the provided date.
+
+    Args:
+        start_date (str): The first date in "YYYY-MM-DD" format.
+
+    Returns:
+        list[dict]: One entry per day, as returned by `get_promotions_for_dates`.
+    """
+    try:
+        start = parse_date(start_date)
+    except ValueError as e:
+        logging.error(f"An error occurred in get_week_promotions: {e}")
+        return []
+    return get_promotions_for_dates(
+        [(start + datetime.timedelta(days=offset)).isoformat() for offset in range(7)]
+    )
@@ -7,8 +7,12 @@ from google.adk.tools.mcp_tool.mcp_session_manager import StreamableHTTPServerPa
 from google.adk.tools.mcp_tool.mcp_toolset import MCPToolset
 
 from .prompts.load_prompts import load_agent_config
+from .tools.availability_check_tools import check_availability_batch
 from .tools.availability_check_tools import check_availability_coffee
+from .tools.availability_check_tools import get_next_availability_coffee
+from .tools.availability_check_tools import is_coffee_available
 from .tools.common_tools import get_today_date
+from model_tiering import ModelTiering
 
 client = google.cloud.logging.Client()
 client.setup_logging()
@@ -28,14 +32,21 @@ agent_config = load_agent_config()
 
 print(agent_config)
 
+model_tiering = ModelTiering("lookup", LLM_AGENT)
+
 
 head_barista_agent = LlmAgent(
     name="head_barista_agent",
     model=LLM_AGENT,
     description=agent_config["description"],
     instruction=agent_config["instruction"],
+    before_model_callback=model_tiering.before_model,
+    after_model_callback=model_tiering.after_model,
     tools=[
         check_availability_coffee,
+        is_coffee_available,
+        get_next_availability_coffee,
+        check_availability_batch,
         get_today_date,
         MCPToolset(
             connection_params=StreamableHTTPServerParams(
@@ -1,4 +1,20 @@
 import logging
+import os
+
+from .availability_index import AvailabilityIndex
+from .availability_index import format_time
+from .availability_index import parse_time
+
+AVAILABILITY_FILE = os.getenv(
+    "AVAILABILITY_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "availability.yaml"),
+)
+
+availability_index = AvailabilityIndex(AVAILABILITY_FILE)
+
+
+def format_window(window: tuple[int, int]) -> dict:
+    return {"from": format_time(window[0]), "until": format_time(window[1])}
 
 
 def check_availability_coffee(datetime: str) -> list[str]:
@@ -12,88 +28,91 @@ def check_availability_coffee(datetime: str) -> list[str]:
         list[str]: A list of available coffee types for the given time.
     """
     try:
-        # Create a dictionary where the key is the military time and the value is the type of coffee based on this information RULES
-        availability_coffee_type = {
-            # --- Morning (Hot Drinks & Classics) ---
-            "08:00": [
-                "Mocha Magic", "Vanilla Dream", "Espresso Elixir", "Latte Lux",
-                "Cappuccino Charm", "Flat White Velvet"
-            ],
-            "09:00": [
-                "Mocha Magic", "Vanilla Dream", "Espresso Elixir", "Latte Lux",
-                "Cappuccino Charm", "Flat White Velvet", "Matcha Zen"
-            ],
-            "10:00": [
-                "Caramel Delight", "Hazelnut Harmony", "Latte Lux", "Americano Bold",
-                "Chai Spice Serenity", "Matcha Zen"
-            ],
-            "11:00": [
-                "Caramel Delight", "Honey Lavender Haze", "Espresso Elixir", "Cortado Cut",
-                "Flat White Velvet", "Golden Turmeric Glow"
-            ],
+        logging.info(f"Checking availability for {datetime}")
+        available = availability_index.available_at(parse_time(datetime))
+        logging.info(f"Availability for {datetime}: {available}")
+        return available
 
-            # --- Noon (Shift to Cold Drinks & Alternatives) ---
-            "12:00": [
-                "Vanilla Dream", "Hazelnut Harmony", "Cold Brew Breeze", "Iced Caramel Cloud",
-                "Matcha Zen", "Chai Spice Serenity"
-            ],
-            "13:00": [
-                "Vanilla Dream", "Hazelnut Harmony", "Cold Brew Breeze", "Iced Caramel Cloud",
-                "Flat White Velvet", "Americano Bold",
-                # NOTE: Affogato Bliss and Nitro Noir are intentionally excluded for testing 'Sold Out' logic.
-            ],
+    except Exception as e:
+        logging.error(f"An error occurred in check_availability_coffee: {e}")
+        return []
 
-            # --- Afternoon (Desserts and Limited Stock) ---
-            "14:00": [
-                "Vanilla Dream", "Cold Brew Breeze", "Latte Lux", "Cortado Cut",
-                "Golden Turmeric Glow"
-            ],
-            "15:00": [
-                "Mocha Magic", "Caramel Delight", "Iced Caramel Cloud", "Chai Spice Serenity"
-            ],
 
-            # --- Late Afternoon (Return to Classics) ---
-            "16:00": [
-                "Caramel Delight", "Espresso Elixir", "Latte Lux", "Cappuccino Charm",
-                "Flat White Velvet"
-            ],
-            "17:00": [
-                "Caramel Delight", "Honey Lavender Haze", "Americano Bold", "Cortado Cut"
-            ],
-            "18:00": [
-                "Caramel Delight", "Mocha Magic", "Hazelnut Harmony", "Matcha Zen"
-            ],
+def is_coffee_available(coffee_type: str, datetime: str) -> dict:
+    """
+    Checks whether one coffee type is available at the provided datetime, and when it can be served otherwise.
 
-            # --- Evening (Limited Stock and Specials) ---
-            "19:00": [
-                "Mocha Magic", "Vanilla Dream", "Hazelnut Harmony", "Espresso Elixir",
-                "Chai Spice Serenity"
-            ],
-            "20:00": [
-                "Caramel Delight", "Mocha Magic", "Latte Lux", "Golden Turmeric Glow"
-            ],
-            "21:00": [
-                "Caramel Delight", "Mocha Magic", "Latte Lux", "Golden Turmeric Glow"
-            ],
-            "22:00": [
-                "Mocha Magic", "Vanilla Dream", "Hazelnut Harmony", "Espresso Elixir",
-                "Chai Spice Serenity"
+    Args:
+        coffee_type (str): The name of the coffee, e.g. "Nitro Noir".
+        datetime (str): The datetime in "HH:MM" format (military time).
+
+    Returns:
+        dict: Whether the coffee is available, the window it is served in (or the next one) and all its windows of the day.
+    """
+    try:
+        minute = parse_time(datetime)
+        window = availability_index.next_available(coffee_type, minute)
+        return {
+            "coffee_type": availability_index.drink_name(coffee_type) or coffee_type,
+            "datetime": datetime,
+            "available": availability_index.is_available(coffee_type, minute),
+            "window": format_window(window) if window else None,
+            "windows": [
+                format_window(window)
+                for window in availability_index.windows(coffee_type)
             ],
         }
 
-        logging.info(f"Checking availability for {datetime}")
+    except Exception as e:
+        logging.error(f"An error occurred in is_coffee_available: {e}")
+        return {"coffee_type": coffee_type, "datetime": datetime, "error": str(e)}
 
-        hour = datetime.split(":")[0]
-        hour_key = hour + ":00"
 
-        if hour_key in availability_coffee_type:
-            logging.info(
-                f"Availability for {hour_key}: {availability_coffee_type[hour_key]}"
-            )
-            return availability_coffee_type[hour_key]
+def get_next_availability_coffee(coffee_type: str, datetime: str) -> dict:
+    """
+    Finds when a coffee type is next available from the provided datetime. Use it instead of checking hour by hour.
 
-        return []
+    Args:
+        coffee_type (str): The name of the coffee, e.g. "Nitro Noir".
+        datetime (str): The datetime in "HH:MM" format (military time) to search from.
+
+    Returns:
+        dict: The next time the coffee is served and until when ("available_now" if it is served at that time, "tomorrow" if it is only served earlier in the day), or "never" if it is not on the schedule.
+    """
+    try:
+        minute = parse_time(datetime)
+        window = availability_index.next_available(coffee_type, minute)
+        if window is None:
+            return {"coffee_type": coffee_type, "datetime": datetime, "never": True}
+
+        start, end = window
+        return {
+            "coffee_type": availability_index.drink_name(coffee_type),
+            "datetime": datetime,
+            "available_now": start <= minute < end,
+            "next_available": format_time(
+                max(start, minute) if minute < end else start
+            ),
+            "until": format_time(end),
+            "tomorrow": minute >= end,
+        }
 
     except Exception as e:
-        logging.error(f"An error occurred in check_availability_coffee: {e}")
-        return []
+        logging.error(f"An error occurred in get_next_availability_coffee: {e}")
+        return {"coffee_type": coffee_type, "datetime": datetime, "error": str(e)}
+
+
+def check_availability_batch(checks: list[dict]) -> list[dict]:
+    """
+    Checks the availability of several (coffee type, datetime) pairs in a single call.
+
+    Args:
+        checks (list[dict]): The pairs to check, each as {"coffee_type": "Latte Lux", "datetime": "HH:MM"}.
+
+    Returns:
+        list[dict]: One entry per pair, in the same order, with the same fields as `is_coffee_available`.
+    """
+    return [
+        is_coffee_available(check.get("coffee_type", ""), check.get("datetime", ""))
+        for check in checks
+    ]
@@ -0,0 +1,166 @@
+import logging
+import os
+import threading
+
+import yaml  # type: ignore[import-untyped]
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def parse_time(value: str) -> int:
+    """
+    Returns the minute of the day of a military time. Accepts "HH:MM" and full
+    datetimes such as "2025-01-31 14:05:00", whose time part is used.
+
+    Raises:
+        ValueError: If the value has no valid HH:MM time.
+    """
+    time_part = value.strip().split(" ")[-1].split("T")[-1]
+    try:
+        hours, minutes = (int(part) for part in time_part.split(":")[:2])
+    except ValueError:
+        raise ValueError(f"Invalid time: {value}") from None
+    minute = hours * 60 + minutes
+    if not 0 <= minutes < 60 or not 0 <= minute <= MINUTES_PER_DAY:
+        raise ValueError(f"Invalid time: {value}")
+    return minute
+
+
+def format_time(minute: int) -> str:
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+def normalize_drink(drink: str) -> str:
+    return " ".join(drink.lower().split())
+
+
+def merge_windows(windows: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    """Sorts windows and merges the ones that overlap or touch."""
+    merged: list[tuple[int, int]] = []
+    for start, end in sorted(windows):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class AvailabilityIndex:
+    """
+    Drink availability over the day, built from the windows of a YAML file.
+
+    Loading precomputes a minute→drinks table, the windows of every drink, and,
+    per drink, a minute→window table pointing at the window that is open or opens
+    next, so every lookup is a list or dict access. The file is reloaded when its
+    mtime changes; a file that fails to load leaves the previous index in place.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime: float | None = None
+        self._names: dict[str, str] = {}
+        self._by_minute: list[frozenset[str]] = [frozenset()] * MINUTES_PER_DAY
+        self._windows: dict[str, list[tuple[int, int]]] = {}
+        self._next_window: dict[str, list[int]] = {}
+
+    def available_at(self, minute: int) -> list[str]:
+        """Returns the drinks available at a minute of the day, sorted by name."""
+        self.refresh()
+        return sorted(
+            self._names[drink] for drink in self._by_minute[minute % MINUTES_PER_DAY]
+        )
+
+    def is_available(self, drink: str, minute: int) -> bool:
+        self.refresh()
+        return normalize_drink(drink) in self._by_minute[minute % MINUTES_PER_DAY]
+
+    def next_available(self, drink: str, minute: int) -> tuple[int, int] | None:
+        """
+        Returns the window of a drink that is open at `minute` or opens next, as
+        (start, end) minutes of the day. Windows later in the day come first; when
+        there is none, the day wraps around to the first window of the next day.
+
+        Returns:
+            tuple[int, int] | None: The window, or None if the drink is never served.
+        """
+        self.refresh()
+        key = normalize_drink(drink)
+        next_window = self._next_window.get(key)
+        if next_window is None:
+            return None
+        return self._windows[key][next_window[minute % MINUTES_PER_DAY]]
+
+    def windows(self, drink: str) -> list[tuple[int, int]]:
+        self.refresh()
+        return list(self._windows.get(normalize_drink(drink), []))
+
+    def drinks(self) -> list[str]:
+        """Returns the names of every drink on the schedule, sorted."""
+        self.refresh()
+        return sorted(self._names.values())
+
+    def drink_name(self, drink: str) -> str | None:
+        self.refresh()
+        return self._names.get(normalize_drink(drink))
+
+    def refresh(self) -> None:
+        """Reloads the index if the availability file changed since the last load."""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError as e:
+            logging.error(f"Availability file {self.path} is not readable: {e}")
+            return
+        if mtime == self._mtime:
+            return
+
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            try:
+                self._load()
+            except Exception as e:
+                logging.error(f"An error occurred loading {self.path}: {e}")
+            self._mtime = mtime
+
+    def _load(self) -> None:
+        with open(self.path, "r", encoding="utf-8") as file:
+            config = yaml.safe_load(file) or {}
+
+        names: dict[str, str] = {}
+        windows: dict[str, list[tuple[int, int]]] = {}
+        by_minute: list[set[str]] = [set() for _ in range(MINUTES_PER_DAY)]
+        for window in config.get("windows", []):
+            start = parse_time(str(window["start"]))
+            end = parse_time(str(window["end"]))
+            if end <= start:
+                raise ValueError(f"Window ends before it starts: {window}")
+            for drink in window.get("drinks", []):
+                key = normalize_drink(drink)
+                names.setdefault(key, drink)
+                windows.setdefault(key, []).append((start, end))
+                for minute in range(start, end):
+                    by_minute[minute].add(key)
+
+        for key, drink_windows in windows.items():
+            windows[key] = merge_windows(drink_windows)
+
+        next_window: dict[str, list[int]] = {}
+        for key, drink_windows in windows.items():
+            # Minutes after the last window wrap around to the first one.
+            table = [0] * MINUTES_PER_DAY
+            previous_end = 0
+            for index, (_, end) in enumerate(drink_windows):
+                table[previous_end:end] = [index] * (end - previous_end)
+                previous_end = end
+            next_window[key] = table
+
+        interned: dict[frozenset[str], frozenset[str]] = {}
+        self._by_minute = [
+            interned.setdefault(frozenset(drinks), frozenset(drinks))
+            for drinks in by_minute
+        ]
+        self._names, self._windows, self._next_window = names, windows, next_window
+        logging.info(
+            f"Availability index loaded with {len(names)} drinks from {self.path}"
+        )
@@ -0,0 +1,303 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from collections.abc import Awaitable
+from collections.abc import Callable
+
+EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH",
+    os.path.join(tempfile.gettempdir(), "embedding_cache.sqlite3"),
+)
+EMBEDDING_CACHE_MEMORY_SIZE = int(os.getenv("EMBEDDING_CACHE_MEMORY_SIZE", "1024"))
+EMBEDDING_CACHE_DISK_SIZE = int(os.getenv("EMBEDDING_CACHE_DISK_SIZE", "100000"))
+# Disk hits whose access time is written in one batch.
+TOUCH_FLUSH_SIZE = 64
+
+
+def embedding_cache_key(
+    model: str, task_type: str, output_dimensionality: int, text: str
+) -> str:
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return f"{model}:{task_type}:{output_dimensionality}:{text_hash}"
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache: an in-memory LRU in front of a SQLite file.
+
+    Entries evicted from memory stay on disk; the disk tier drops its least recently
+    used entries once it holds more than `disk_size` embeddings. Vectors are stored
+    on disk as float32 blobs. The number of disk entries is kept in memory, and the
+    access times of disk hits are written in batches of `TOUCH_FLUSH_SIZE`, or with
+    the next write.
+
+    The memory tier and the disk tier have separate locks, so a memory lookup never
+    waits for SQLite: `get_many_from_memory` can run on the event loop while
+    `get_many_from_disk` and `write_many` run in a worker thread.
+    """
+
+    def __init__(self, path: str, memory_size: int, disk_size: int):
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self._memory: OrderedDict[str, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+        }
+
+        self._touched: dict[str, float] = {}
+        self._disk_entries = 0
+
+        self._db: sqlite3.Connection | None = None
+        try:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_last_used "
+                "ON embeddings (last_used)"
+            )
+            self._db.commit()
+            (self._disk_entries,) = self._db.execute(
+                "SELECT COUNT(*) FROM embeddings"
+            ).fetchone()
+        except sqlite3.Error as e:
+            logging.error(f"Embedding disk cache disabled, {path} is not usable: {e}")
+            self._db = None
+
+    def get(self, key: str) -> list[float] | None:
+        [vector] = self.get_many_from_memory([key])
+        if vector is None:
+            [vector] = self.get_many_from_disk([key])
+        return vector
+
+    def get_many_from_memory(self, keys: list[str]) -> list[list[float] | None]:
+        """Returns the embeddings held in memory, and None for the other keys."""
+        vectors: list[list[float] | None] = []
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                vectors.append(vector)
+        return vectors
+
+    def get_many_from_disk(self, keys: list[str]) -> list[list[float] | None]:
+        """
+        Returns the embeddings stored on disk, and None for the other keys, and
+        keeps the ones found in memory. It blocks on SQLite, so async callers run
+        it in a worker thread.
+        """
+        with self._db_lock:
+            vectors = [self._read_disk(key) for key in keys]
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                if vector is None:
+                    self._counters["misses"] += 1
+                else:
+                    self._counters["disk_hits"] += 1
+                    self._remember(key, vector)
+        return vectors
+
+    def put(self, key: str, vector: list[float]) -> None:
+        self.put_many([(key, vector)])
+
+    def put_many(self, items: list[tuple[str, list[float]]]) -> None:
+        self.remember_many(items)
+        self.write_many(items)
+
+    def remember_many(self, items: list[tuple[str, list[float]]]) -> None:
+        with self._lock:
+            for key, vector in items:
+                self._remember(key, list(vector))
+
+    def write_many(self, items: list[tuple[str, list[float]]]) -> None:
+        """
+        Writes several embeddings to disk in a single transaction. It blocks on
+        SQLite, so async callers run it in a worker thread.
+        """
+        with self._db_lock:
+            evicted = self._write_disk(items)
+        with self._lock:
+            self._counters["disk_evictions"] += evicted
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self._counters["memory_hits"] + self._counters["disk_hits"]
+            lookups = hits + self._counters["misses"]
+            return {
+                **self._counters,
+                "memory_entries": len(self._memory),
+                "hit_ratio": hits / lookups if lookups else 0.0,
+            }
+
+    def _remember(self, key: str, vector: list[float]) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+            self._counters["memory_evictions"] += 1
+
+    def _read_disk(self, key: str) -> list[float] | None:
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(
+                "SELECT vector FROM embeddings WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._touched[key] = time.time()
+            if len(self._touched) >= TOUCH_FLUSH_SIZE:
+                self._flush_touched()
+                self._db.commit()
+            return array("f", row[0]).tolist()
+        except sqlite3.Error as e:
+            logging.error(f"An error occurred reading the embedding disk cache: {e}")
+            return None
+
+    def _write_disk(self, items: list[tuple[str, list[float]]]) -> int:
+        if self._db is None:
+            return 0
+        try:
+            now = time.time()
+            entries = self._disk_entries
+            for key, vector in items:
+                self._touched.pop(key, None)
+                blob = array("f", vector).tobytes()
+                inserted = self._db.execute(
+                    "INSERT OR IGNORE INTO embeddings (key, vector, last_used) "
+                    "VALUES (?, ?, ?)",
+                    (key, blob, now),
+                ).rowcount
+                if inserted:
+                    entries += 1
+                else:
+                    self._db.execute(
+                        "UPDATE embeddings SET vector = ?, last_used = ? WHERE key = ?",
+                        (blob, now, key),
+                    )
+            self._flush_touched()
+
+            evicted = 0
+            if entries > self.disk_size:
+                evicted = self._db.execute(
+                    "DELETE FROM embeddings WHERE key IN ("
+                    "SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (entries - self.disk_size,),
+                ).rowcount
+            self._db.commit()
+            self._disk_entries = entries - evicted
+            return evicted
+        except sqlite3.Error as e:
+            self._db.rollback()
+            logging.error(f"An error occurred writing the embedding disk cache: {e}")
+            return 0
+
+    def _flush_touched(self) -> None:
+        if self._db is None or not self._touched:
+            return
+        self._db.executemany(
+            "UPDATE embeddings SET last_used = ? WHERE key = ?",
+            [(last_used, key) for key, last_used in self._touched.items()],
+        )
+        self._touched.clear()
+
+
+embedding_cache = EmbeddingCache(
+    EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MEMORY_SIZE, EMBEDDING_CACHE_DISK_SIZE
+)
+
+
+def _keys(
+    texts: list[str], model: str, task_type: str, output_dimensionality: int
+) -> list[str]:
+    return [
+        embedding_cache_key(model, task_type, output_dimensionality, text)
+        for text in texts
+    ]
+
+
+def _missing(vectors: list[list[float] | None]) -> list[int]:
+    return [index for index, vector in enumerate(vectors) if vector is None]
+
+
+def get_cached_embeddings(
+    texts: list[str],
+    embed: Callable[[list[str]], list[list[float]]],
+    model: str,
+    task_type: str,
+    output_dimensionality: int,
+) -> list[list[float]]:
+    """
+    Returns the embeddings of the texts, calling `embed` only once for the texts
+    that are not cached yet.
+
+    Args:
+        texts (list[str]): The texts to embed.
+        embed (Callable[[list[str]], list[list[float]]]): Embeds a list of texts.
+        model (str): The embedding model.
+        task_type (str): The embedding task type.
+        output_dimensionality (int): The embedding size.
+
+    Returns:
+        list[list[float]]: One embedding per text, in the same order as `texts`.
+    """
+    keys = _keys(texts, model, task_type, output_dimensionality)
+    vectors = [embedding_cache.get(key) for key in keys]
+    missing = _missing(vectors)
+    if missing:
+        computed = embed([texts[index] for index in missing])
+        items = [(keys[index], vector) for index, vector in zip(missing, computed)]
+        embedding_cache.put_many(items)
+        for index, vector in zip(missing, computed):
+            vectors[index] = list(vector)
+    return vectors  # type: ignore[return-value]
+
+
+async def aget_cached_embeddings(
+    texts: list[str],
+    embed: Callable[[list[str]], Awaitable[list[list[float]]]],
+    model: str,
+    task_type: str,
+    output_dimensionality: int,
+) -> list[list[float]]:
+    """
+    Async version of `get_cached_embeddings`, for an `embed` coroutine. The memory
+    tier is read on the event loop; the SQLite reads and writes run in a worker
+    thread, so they never stall the loop.
+    """
+    keys = _keys(texts, model, task_type, output_dimensionality)
+    vectors = embedding_cache.get_many_from_memory(keys)
+    missing = _missing(vectors)
+    if missing:
+        on_disk = await asyncio.to_thread(
+            embedding_cache.get_many_from_disk, [keys[index] for index in missing]
+        )
+        for index, vector in zip(missing, on_disk):
+            vectors[index] = vector
+        missing = _missing(vectors)
+    if missing:
+        computed = await embed([texts[index] for index in missing])
+        items = [(keys[index], vector) for index, vector in zip(missing, computed)]
+        embedding_cache.remember_many(items)
+        await asyncio.to_thread(embedding_cache.write_many, items)
+        for index, vector in zip(missing, computed):
+            vectors[index] = list(vector)
+    return vectors  # type: ignore[return-value]
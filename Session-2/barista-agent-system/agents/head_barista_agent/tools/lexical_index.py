@@ -0,0 +1,118 @@
+import re
+from collections import Counter
+
+ITEM_PATTERN = re.compile(r"\*\*(?P<name>[^*]+)\*\*:")
+BULLET_PATTERN = re.compile(r"^\s*[-*+]\s+")
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "a", "about", "an", "and", "any", "are", "available", "can", "cost", "do",
+    "does", "for", "have", "how", "i", "in", "is", "it", "me", "much", "of", "on",
+    "one", "or", "please", "price", "show", "some", "tell", "the", "to", "what",
+    "with", "you", "your",
+}  # fmt: skip
+
+
+def normalize(text: str) -> str:
+    return " ".join(TOKEN_PATTERN.findall(text.lower()))
+
+
+def tokenize(text: str) -> list[str]:
+    return [
+        token[:-1] if len(token) > 3 and token.endswith("s") else token
+        for token in TOKEN_PATTERN.findall(text.lower())
+    ]
+
+
+class MenuLexicalIndex:
+    """
+    Inverted index over the menu item names, categories and description tokens,
+    built from the `text_content` of the menu documents.
+
+    It answers queries that name an item or a category exactly, by the first whole
+    words of an item name, or whose tokens all point to a few items, so they can
+    skip the embedding call. Queries it cannot resolve are left to the semantic
+    search.
+    """
+
+    def __init__(self):
+        self._items: list[str] = []
+        self._names: dict[str, int] = {}
+        self._categories: dict[str, str] = {}
+        self._tokens: dict[str, set[int]] = {}
+        self.counters: Counter = Counter()
+
+    def rebuild(self, documents: list[str]) -> None:
+        items: list[str] = []
+        names: dict[str, int] = {}
+        categories: dict[str, str] = {}
+        tokens: dict[str, set[int]] = {}
+
+        for document in documents:
+            category, _, content = document.partition(" - ")
+            if normalize(category):
+                categories[normalize(category)] = document
+
+            for line in content.splitlines():
+                match = ITEM_PATTERN.search(line)
+                if not match:
+                    continue
+                index = len(items)
+                item = BULLET_PATTERN.sub("", line).strip()
+                items.append(f"{category} - {item}")
+                names[normalize(match.group("name"))] = index
+                for token in set(tokenize(f"{category} {line}")):
+                    tokens.setdefault(token, set()).add(index)
+
+        self._items, self._names = items, names
+        self._categories, self._tokens = categories, tokens
+
+    def lookup(self, query: str, limit: int) -> tuple[str, list[str]] | None:
+        """
+        Resolves a query from the index.
+
+        Args:
+            query (str): The search query.
+            limit (int): The maximum number of menu items a match may return.
+
+        Returns:
+            tuple[str, list[str]] | None: The match type ("exact", "name", "prefix"
+            or "token") and the matching menu texts, or None to fall through to
+            the semantic search.
+        """
+        match = self._lookup(normalize(query), limit)
+        self.counters[match[0] if match else "miss"] += 1
+        return match
+
+    def _lookup(self, query: str, limit: int) -> tuple[str, list[str]] | None:
+        if not query:
+            return None
+
+        if query in self._names:
+            return "exact", [self._items[self._names[query]]]
+        if query in self._categories:
+            return "exact", [self._categories[query]]
+
+        padded_query = f" {query} "
+        named = [
+            index for name, index in self._names.items() if f" {name} " in padded_query
+        ]
+        if named and len(named) <= limit:
+            return "name", [self._items[index] for index in named]
+
+        # Only whole words: "latte" resolves to "Latte Lux", but "lat" does not.
+        prefixed = [
+            index for name, index in self._names.items() if name.startswith(f"{query} ")
+        ]
+        if prefixed and len(prefixed) <= limit:
+            return "prefix", [self._items[index] for index in prefixed]
+
+        query_tokens = [token for token in tokenize(query) if token not in STOPWORDS]
+        if not query_tokens:
+            return None
+        matches = set.intersection(
+            *[self._tokens.get(token, set()) for token in query_tokens]
+        )
+        if matches and len(matches) <= limit:
+            return "token", [self._items[index] for index in sorted(matches)]
+
+        return None
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import time
+from collections.abc import Callable
+
+from google.cloud import firestore
+
+from .vector_codec import decode_embedding
+from .vector_codec import QuantizedMatrix
+
+
+class MenuVectorIndex:
+    """
+    In-process copy of the menu collection for cosine top-k search.
+
+    Every embedding is kept as an int8 row of a `QuantizedMatrix`, a quarter of its
+    float32 size, and a search is a coarse pass on the Matryoshka prefix followed by
+    a full-length rerank of the shortlist. The index checks the version document
+    written by the ingestion pipeline at most every `refresh_seconds` and reloads
+    the collection when it changed. `on_load`, if given, receives the
+    `text_content` of every document after each load.
+    """
+
+    def __init__(
+        self,
+        db: firestore.AsyncClient,
+        collection: str,
+        version_collection: str,
+        version_document: str,
+        refresh_seconds: float,
+        on_load: Callable[[list[str]], None] | None = None,
+    ):
+        self._db = db
+        self._collection = collection
+        self._version_ref = db.collection(version_collection).document(version_document)
+        self.refresh_seconds = refresh_seconds
+        self._on_load = on_load
+        self._lock = asyncio.Lock()
+        self._snapshot: tuple[list[str], QuantizedMatrix] = (
+            [],
+            QuantizedMatrix.from_rows([]),
+        )
+        self.version: int | None = None
+        self._loaded = False
+        self._checked_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self._snapshot[0])
+
+    async def search(
+        self, query_vector: list[float], limit: int
+    ) -> list[tuple[str, float]]:
+        """
+        Returns the `limit` menu documents closest to the query vector.
+
+        Args:
+            query_vector (list[float]): The query embedding.
+            limit (int): The number of documents to return.
+
+        Returns:
+            list[tuple[str, float]]: The (text_content, cosine distance) pairs, closest
+            first.
+        """
+        return (await self.search_many([query_vector], limit))[0]
+
+    async def search_many(
+        self, query_vectors: list[list[float]], limit: int
+    ) -> list[list[tuple[str, float]]]:
+        """
+        Returns the `limit` menu documents closest to each query vector, scoring all
+        the queries with a single matrix product.
+
+        Args:
+            query_vectors (list[list[float]]): The query embeddings.
+            limit (int): The number of documents to return per query.
+
+        Returns:
+            list[list[tuple[str, float]]]: For each query, the (text_content, cosine
+            distance) pairs, closest first.
+        """
+        await self.refresh()
+        texts, matrix = self._snapshot
+        if not texts or not query_vectors:
+            return [[] for _ in query_vectors]
+
+        top, top_similarities = matrix.search(query_vectors, limit)
+
+        return [
+            [
+                (texts[index], float(1.0 - similarity))
+                for index, similarity in zip(row, row_similarities)
+            ]
+            for row, row_similarities in zip(top, top_similarities)
+        ]
+
+    async def refresh(self) -> None:
+        """Reloads the index if the menu collection changed since the last load."""
+        if self._loaded and time.monotonic() - self._checked_at < self.refresh_seconds:
+            return
+
+        async with self._lock:
+            if (
+                self._loaded
+                and time.monotonic() - self._checked_at < self.refresh_seconds
+            ):
+                return
+
+            version_doc = await self._version_ref.get()
+            version = version_doc.get("version") if version_doc.exists else None
+            if not self._loaded or version != self.version:
+                await self._load()
+                self.version = version
+                self._loaded = True
+            self._checked_at = time.monotonic()
+
+    async def _load(self) -> None:
+        texts = []
+        rows = []
+        docs = (
+            self._db.collection(self._collection)
+            .select(["text_content", "embedding_q8", "embedding_scale", "embedding"])
+            .stream()
+        )
+        async for doc in docs:
+            data = doc.to_dict() or {}
+            row = decode_embedding(data)
+            if row is None:
+                continue
+            texts.append(data.get("text_content", ""))
+            rows.append(row)
+
+        matrix = QuantizedMatrix.from_rows(rows)
+        self._snapshot = (texts, matrix)
+        if self._on_load is not None:
+            self._on_load(texts)
+        logging.info(
+            f"Menu vector index loaded with {len(texts)} documents "
+            f"({matrix.nbytes} bytes)"
+        )
@@ -1,3 +1,7 @@
+import asyncio
+import functools
+import logging
+import os
 from typing import List
 
 from dotenv import load_dotenv
@@ -7,6 +11,14 @@ from google.cloud.firestore_v1.base_vector_query import DistanceMeasure
 from google.cloud.firestore_v1.vector import Vector
 from google.genai import types
 
+from .embedding_cache import aget_cached_embeddings
+from .lexical_index import MenuLexicalIndex
+from .menu_index import MenuVectorIndex
+from .vector_codec import coarse_vector
+from .vector_codec import decode_embedding
+from .vector_codec import QuantizedMatrix
+from .vector_codec import shortlist_size
+
 # Carga las variables de entorno desde un archivo .env
 load_dotenv()
 
@@ -14,9 +26,141 @@ load_dotenv()
 MENU_FIRESTORE_COLLECTION = "menu"
 DATABASE_NAME = "embeddings"
 GEMINI_MODEL_EMBEDDING = "gemini-embedding-001"
+EMBEDDING_TASK_TYPE = "SEMANTIC_SIMILARITY"
+EMBEDDING_DIMENSIONALITY = 768
+MENU_INDEX_COLLECTION = "menu_index"
+MENU_INDEX_STATE_DOCUMENT = "state"
+MENU_SEARCH_LIMIT = 2
+MENU_SEARCH_MAX_TOP_K = 10
+MENU_SEARCH_BACKEND = os.getenv("MENU_SEARCH_BACKEND", "numpy")
+MENU_INDEX_REFRESH_SECONDS = float(os.getenv("MENU_INDEX_REFRESH_SECONDS", "30"))
+
+lexical_index = MenuLexicalIndex()
+
+
+@functools.cache
+def get_genai_client() -> genai.Client:
+    return genai.Client()
+
+
+@functools.cache
+def get_firestore_client() -> firestore.AsyncClient:
+    return firestore.AsyncClient(database=DATABASE_NAME)
+
+
+@functools.cache
+def get_menu_index() -> MenuVectorIndex:
+    return MenuVectorIndex(
+        get_firestore_client(),
+        MENU_FIRESTORE_COLLECTION,
+        MENU_INDEX_COLLECTION,
+        MENU_INDEX_STATE_DOCUMENT,
+        MENU_INDEX_REFRESH_SECONDS,
+        on_load=lexical_index.rebuild,
+    )
+
+
+async def embed_texts(texts: list[str]) -> list[list[float]]:
+    result = await get_genai_client().aio.models.embed_content(
+        model=GEMINI_MODEL_EMBEDDING,
+        contents=texts,
+        config=types.EmbedContentConfig(
+            task_type=EMBEDDING_TASK_TYPE,
+            output_dimensionality=EMBEDDING_DIMENSIONALITY,
+        ),
+    )
+    return [embedding.values for embedding in result.embeddings]
+
+
+async def search_menu_firestore(
+    query_embedding: list[float], limit: int, max_distance: float | None = None
+) -> list[tuple[str, float]]:
+    """
+    Shortlists menu documents with Firestore `find_nearest` on the coarse prefix and
+    reranks them on their full int8 embeddings.
+    """
+    collection = get_firestore_client().collection(MENU_FIRESTORE_COLLECTION)
+    vector_query = collection.find_nearest(
+        vector_field="embedding_coarse",
+        query_vector=Vector(coarse_vector(query_embedding)),
+        distance_measure=DistanceMeasure.COSINE,
+        limit=shortlist_size(limit),
+    )
+
+    texts = []
+    rows = []
+    async for doc in vector_query.stream():
+        row = decode_embedding(doc.to_dict() or {})
+        if row is not None:
+            texts.append(doc.get("text_content"))
+            rows.append(row)
+    if not rows:
+        return []
+
+    top, top_similarities = QuantizedMatrix.from_rows(rows).search(
+        [query_embedding], limit
+    )
+    return [
+        (texts[index], float(1.0 - similarity))
+        for index, similarity in zip(top[0], top_similarities[0])
+        if max_distance is None or 1.0 - similarity <= max_distance
+    ]
+
+
+async def search_menu_scored(
+    query_embeddings: list[list[float]], limit: int, max_distance: float | None = None
+) -> list[list[tuple[str, float]]]:
+    """
+    Returns the (text_content, cosine distance) pairs of the menu documents closest
+    to each query embedding, from the in-process vector index or, as a fallback,
+    from Firestore `find_nearest`.
+    """
+    if MENU_SEARCH_BACKEND == "numpy":
+        try:
+            results = await get_menu_index().search_many(query_embeddings, limit)
+            if any(results):
+                return [
+                    [
+                        (text_content, distance)
+                        for text_content, distance in query_results
+                        if max_distance is None or distance <= max_distance
+                    ]
+                    for query_results in results
+                ]
+        except Exception as e:
+            logging.error(f"An error occurred in the menu vector index: {e}")
+
+    return list(
+        await asyncio.gather(
+            *[
+                search_menu_firestore(query_embedding, limit, max_distance)
+                for query_embedding in query_embeddings
+            ]
+        )
+    )
 
 
-def get_menu_items(type_coffee: str) -> List[str]:
+async def lookup_menu_lexical(query: str, limit: int) -> tuple[str, list[str]] | None:
+    """
+    Resolves a query from the lexical index over item names, categories and
+    ingredients, or returns None when it has to go through the semantic search.
+    """
+    try:
+        await get_menu_index().refresh()
+        match = lexical_index.lookup(query, limit)
+        logging.info(f"Lexical lookup for '{query}': {match[0] if match else 'miss'}")
+        return match
+    except Exception as e:
+        logging.error(f"An error occurred in the menu lexical index: {e}")
+        return None
+
+
+async def search_menu(query_embedding: list[float], limit: int) -> list[str]:
+    results = await search_menu_scored([query_embedding], limit)
+    return [text_content for text_content, _ in results[0]]
+
+
+async def get_menu_items(type_coffee: str) -> List[str]:
     """
     Returns a list of menu items based on the type of coffee.
 
@@ -28,41 +172,88 @@ def get_menu_items(type_coffee: str) -> List[str]:
     """
 
     try:
-        db = firestore.Client(database=DATABASE_NAME)
+        match = await lookup_menu_lexical(type_coffee, MENU_SEARCH_LIMIT)
+        if match:
+            return match[1]
 
-        client = genai.Client()
+        query_embedding = (
+            await aget_cached_embeddings(
+                [type_coffee],
+                embed_texts,
+                GEMINI_MODEL_EMBEDDING,
+                EMBEDDING_TASK_TYPE,
+                EMBEDDING_DIMENSIONALITY,
+            )
+        )[0]
 
-        print("creating embeddings...")
+        menu_items = await search_menu(query_embedding, MENU_SEARCH_LIMIT)
+        logging.info(f"Found {len(menu_items)} menu items")
 
-        result = client.models.embed_content(
-            model=GEMINI_MODEL_EMBEDDING,
-            contents=type_coffee,
-            config=types.EmbedContentConfig(
-                task_type="SEMANTIC_SIMILARITY",
-                output_dimensionality=768,
-            ),
-        )
+        return menu_items
+
+    except Exception as e:
+        logging.error(f"An error occurred in get_menu_items: {e}")
+        return []
 
-        embeddings_collection = db.collection(MENU_FIRESTORE_COLLECTION)
 
-        vector_query = embeddings_collection.find_nearest(
-            vector_field="embedding",
-            query_vector=Vector(result.embeddings[0].values),
-            distance_measure=DistanceMeasure.COSINE,
-            limit=2,
-        )
+async def get_menu_items_batch(
+    search_queries: list[str], top_k: int = 2, max_distance: float = 1.0
+) -> list[dict]:
+    """
+    Search the menu database for several drinks, categories or ingredients at once.
+    Use this instead of calling `get_menu_items` several times in the same turn,
+    e.g. to compare categories.
 
-        docs = vector_query.stream()
-        print("Getting menu items...")
+    Args:
+        search_queries (list[str]): The terms to search for (e.g., ["matcha", "cold drinks", "price of latte"]).
+        top_k (int): The maximum number of menu items to return per query (1 to 10).
+        max_distance (float): The cosine distance cutoff (0 is identical, 2 is opposite); items farther from the query are left out. It does not apply to lexical matches.
 
-        menu_items = []
+    Returns:
+        list[dict]: One entry per query with how it was matched and its matching menu items and their cosine distances, closest first. Lexical matches (an exact item name, category or ingredient, or an item name prefix) are not embedded, so their distance is None. If the search fails, every entry has the match "error" and no items.
+    """
 
-        for doc in docs:
-            print(doc.get("text_content"))
-            menu_items.append(doc.get("text_content"))
+    try:
+        top_k = max(1, min(top_k, MENU_SEARCH_MAX_TOP_K))
+        matches = [
+            await lookup_menu_lexical(search_query, top_k)
+            for search_query in search_queries
+        ]
+        results: list[dict] = [
+            {
+                "query": search_query,
+                "match": match[0],
+                "results": [
+                    {"text_content": text_content, "distance": None}
+                    for text_content in match[1]
+                ],
+            }
+            if match
+            else {"query": search_query, "match": "semantic", "results": []}
+            for search_query, match in zip(search_queries, matches)
+        ]
 
-        return menu_items
+        unresolved = [index for index, match in enumerate(matches) if match is None]
+        if unresolved:
+            query_embeddings = await aget_cached_embeddings(
+                [search_queries[index] for index in unresolved],
+                embed_texts,
+                GEMINI_MODEL_EMBEDDING,
+                EMBEDDING_TASK_TYPE,
+                EMBEDDING_DIMENSIONALITY,
+            )
+            scored = await search_menu_scored(query_embeddings, top_k, max_distance)
+            for index, query_results in zip(unresolved, scored):
+                results[index]["results"] = [
+                    {"text_content": text_content, "distance": round(distance, 4)}
+                    for text_content, distance in query_results
+                ]
+
+        return results
 
     except Exception as e:
-        print(f"An error occurred in get_menu_items: {e}")
-        return []
+        logging.error(f"An error occurred in get_menu_items_batch: {e}")
+        return [
+            {"query": search_query, "match": "error", "results": []}
+            for search_query in search_queries
+        ]
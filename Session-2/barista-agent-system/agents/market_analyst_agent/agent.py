@@ -6,6 +6,7 @@ from dotenv import load_dotenv
 from google.adk.agents import LlmAgent
 
 from .prompts.load_prompts import load_agent_config
+from model_tiering import ModelTiering
 
 client = google.cloud.logging.Client()
 client.setup_logging()
@@ -26,10 +27,14 @@ agent_config = load_agent_config()
 toolbox = ToolboxSyncClient(TOOLBOX_URL)
 tools = toolbox.load_toolset('drinks_toolset')
 
+model_tiering = ModelTiering("analyst", LLM_AGENT)
+
 market_analyst_agent = LlmAgent(
     name="market_analyst_agent",
     model=LLM_AGENT,
     description=agent_config["description"],
     instruction=agent_config["instruction"],
+    before_model_callback=model_tiering.before_model,
+    after_model_callback=model_tiering.after_model,
     tools=list(tools),
 )
@@ -10,11 +10,15 @@ from head_barista_agent import head_barista_agent
 from creative_director_agent import creative_director_agent
 from market_analyst_agent import market_analyst_agent
 from .tools.common_tools import get_today_date
+from .tools.context_prefetch import prefetch_context
+from .tools.dispatch_tools import ask_specialists
+from .tools.intent_fast_path import answer_fast_path
+from model_tiering import ModelTiering
+from .tools.specialist_router import route_to_specialist
 from .tools.memory_tools import save_user_preference
 from .tools.memory_tools import get_user_memories
 from .tools.memory_tools import forget_user_memories
 
-
 client = google.cloud.logging.Client()
 client.setup_logging()
 
@@ -29,16 +33,22 @@ agent_config = load_agent_config()
 
 print(agent_config)
 
+model_tiering = ModelTiering("router", LLM_AGENT)
+
 
 root_agent = LlmAgent(
     name="orchestrator_agent",
     model=LLM_AGENT,
     description=agent_config["description"],
     instruction=agent_config["instruction"],
+    before_model_callback=model_tiering.before_model,
+    after_model_callback=model_tiering.after_model,
+    before_agent_callback=[answer_fast_path, prefetch_context, route_to_specialist],
     tools=[
         AgentTool(head_barista_agent),
         AgentTool(creative_director_agent),
         AgentTool(market_analyst_agent),
+        ask_specialists,
         get_today_date,
         save_user_preference,
         get_user_memories,
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+
+from creative_director_agent.tools.promotions_tools import get_current_promotion
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.agents.readonly_context import ReadonlyContext
+
+from .common_tools import get_today_date
+from .memory_tools import DEFAULT_USER_ID
+from .memory_tools import get_user_memories
+
+NO_PROMOTION = "No promotion today."
+UNAVAILABLE = "Unavailable, call the tool."
+
+
+def get_request_text(callback_context: CallbackContext) -> str:
+    content = callback_context.user_content
+    if content is None or not content.parts:
+        return ""
+    return " ".join(part.text for part in content.parts if part.text)
+
+
+def is_first_turn(context: InvocationContext | ReadonlyContext) -> bool:
+    """
+    Whether no user message came before this invocation in the session. A later
+    turn may refer to earlier ones ("and its price?"), so it only makes sense with
+    the session history.
+    """
+    return not any(
+        event.author == "user" and event.invocation_id != context.invocation_id
+        for event in context.session.events
+    )
+
+
+async def prefetch_context(callback_context: CallbackContext) -> None:
+    """
+    Before-agent callback that loads the current date, today's promotion and the
+    user memories relevant to the request into the session state, in parallel. The
+    instruction reads them as `{today_date}`, `{current_promotion}` and
+    `{user_memories}`, so the model does not need a tool call for them.
+    """
+    today_date = get_today_date()
+    promotion_result, memories_result = await asyncio.gather(
+        asyncio.to_thread(get_current_promotion, today_date),
+        get_user_memories(DEFAULT_USER_ID, get_request_text(callback_context)),
+        return_exceptions=True,
+    )
+
+    promotion: str
+    if isinstance(promotion_result, BaseException):
+        logging.error(
+            f"An error occurred prefetching the promotion: {promotion_result}"
+        )
+        promotion = UNAVAILABLE
+    elif promotion_result is None:
+        promotion = NO_PROMOTION
+    else:
+        promotion = f"{promotion_result['name']}: {promotion_result['deal']}"
+
+    memories: str
+    if isinstance(memories_result, BaseException):
+        logging.error(
+            f"An error occurred prefetching the user memories: {memories_result}"
+        )
+        memories = UNAVAILABLE
+    else:
+        memories = memories_result
+
+    callback_context.state["today_date"] = today_date
+    callback_context.state["current_promotion"] = promotion
+    callback_context.state["user_memories"] = memories
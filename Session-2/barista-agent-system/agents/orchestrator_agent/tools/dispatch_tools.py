@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import aclosing
+from typing import Any
+
+from creative_director_agent import creative_director_agent
+from google.adk.agents import BaseAgent
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.memory import InMemoryMemoryService
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.adk.tools import ToolContext
+from google.genai import types
+from head_barista_agent import head_barista_agent
+from market_analyst_agent import market_analyst_agent
+
+SPECIALIST_DEADLINE_SECONDS = float(os.getenv("SPECIALIST_DEADLINE_SECONDS", "30"))
+MAX_SPECIALIST_QUESTIONS = 6
+
+specialists: dict[str, BaseAgent] = {
+    agent.name: agent
+    for agent in (head_barista_agent, creative_director_agent, market_analyst_agent)
+}
+
+
+async def run_specialist(
+    agent: BaseAgent, question: str, context: CallbackContext
+) -> str:
+    """
+    Runs a specialist on a question in a child runner, the way `AgentTool` does,
+    and returns the text of its last reply. The runner is closed in a `finally`, in
+    the task that ran it, so its MCP sessions are released even when the deadline
+    cancels the run.
+    """
+    # The plugins (e.g. the response cache) and credentials of the parent run are
+    # shared with the child runner, as `AgentTool` shares them.
+    invocation_context = context._invocation_context
+    runner = Runner(
+        app_name=context.session.app_name,
+        agent=agent,
+        session_service=InMemorySessionService(),
+        memory_service=InMemoryMemoryService(),
+        credential_service=invocation_context.credential_service,
+        plugins=list(invocation_context.plugin_manager.plugins),
+    )
+    try:
+        session = await runner.session_service.create_session(
+            app_name=context.session.app_name,
+            user_id=context.user_id,
+            state={
+                key: value
+                for key, value in context.state.to_dict().items()
+                if not key.startswith("_adk")
+            },
+        )
+        last_content = None
+        async with aclosing(
+            runner.run_async(
+                user_id=session.user_id,
+                session_id=session.id,
+                new_message=types.Content(
+                    role="user", parts=[types.Part.from_text(text=question)]
+                ),
+            )
+        ) as events:
+            async for event in events:
+                if event.actions.state_delta:
+                    context.state.update(event.actions.state_delta)
+                if event.content:
+                    last_content = event.content
+    finally:
+        await runner.close()
+
+    if last_content is None or not last_content.parts:
+        return ""
+    return "\n".join(part.text for part in last_content.parts if part.text)
+
+
+async def ask_specialist(
+    specialist: str,
+    question: str,
+    context: CallbackContext,
+    deadline_seconds: float = SPECIALIST_DEADLINE_SECONDS,
+) -> dict:
+    started = time.monotonic()
+    result: dict[str, Any] = {"specialist": specialist, "question": question}
+    try:
+        agent = specialists.get(specialist)
+        if agent is None:
+            raise ValueError(
+                f"Unknown specialist, use one of: {', '.join(specialists)}"
+            )
+        result["answer"] = await asyncio.wait_for(
+            run_specialist(agent, question, context), deadline_seconds
+        )
+    except asyncio.TimeoutError:
+        logging.error(f"{specialist} did not answer within the deadline: {question}")
+        result["error"] = (
+            f"No answer within {deadline_seconds:g} seconds, ask again "
+            "separately if it is still needed."
+        )
+    except Exception as e:
+        logging.error(f"An error occurred asking {specialist}: {e}")
+        result["error"] = str(e)
+
+    result["seconds"] = round(time.monotonic() - started, 2)
+    return result
+
+
+async def ask_specialists(questions: list[dict], tool_context: ToolContext) -> dict:
+    """
+    Sends independent sub-questions to several specialists at the same time and returns all their answers together. Use it when a request has several intents, e.g. "what's on promo and is it in stock right now", instead of calling the specialists one after another.
+
+    Args:
+        questions (list[dict]): The sub-questions, each as {"specialist": "head_barista_agent", "question": "Is the Nitro Noir available now?"}. The specialists are "head_barista_agent" (menu, prices, ingredients, availability), "creative_director_agent" (images, promotions) and "market_analyst_agent" (trends, recommendations).
+
+    Returns:
+        dict: The answers in the same order, each with the specialist, the question and either its "answer" or an "error" (e.g. when the specialist missed the deadline).
+    """
+    if len(questions) > MAX_SPECIALIST_QUESTIONS:
+        return {
+            "error": f"Ask at most {MAX_SPECIALIST_QUESTIONS} questions at a time.",
+        }
+
+    started = time.monotonic()
+    answers = await asyncio.gather(
+        *(
+            ask_specialist(
+                question.get("specialist", ""),
+                question.get("question", ""),
+                tool_context,
+            )
+            for question in questions
+        )
+    )
+    logging.info(
+        f"Asked {len(answers)} specialists in {time.monotonic() - started:.2f}s"
+    )
+    return {"answers": answers}
@@ -0,0 +1,226 @@
+import asyncio
+import datetime
+import logging
+import os
+import re
+
+import numpy as np
+from creative_director_agent.tools.promotions_tools import get_current_promotion
+from google.adk.agents.callback_context import CallbackContext
+from google.genai import types
+from head_barista_agent.tools.availability_check_tools import availability_index
+from head_barista_agent.tools.availability_check_tools import (
+    check_availability_coffee,
+)
+from head_barista_agent.tools.availability_check_tools import is_coffee_available
+
+from .common_tools import get_today_date
+from .context_prefetch import get_request_text
+from .context_prefetch import is_first_turn
+from .memory_tools import DEFAULT_USER_ID
+from .memory_tools import forget_user_memories
+from .request_embedding import embed_normalized
+from .request_embedding import embed_request
+from .request_embedding import normalize_request
+
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "true").lower() == "true"
+FAST_PATH_MIN_SIMILARITY = float(os.getenv("FAST_PATH_MIN_SIMILARITY", "0.75"))
+FAST_PATH_MIN_MARGIN = float(os.getenv("FAST_PATH_MIN_MARGIN", "0.03"))
+FAST_PATH_MAX_WORDS = 12
+
+INTENT_PROMOTION = "promotion"
+INTENT_AVAILABILITY = "availability"
+INTENT_FORGET = "forget"
+
+# A request must match the keywords of an intent before its embedding is compared
+# with the intent centroids, so the fast path only answers requests in English.
+INTENT_PATTERNS = {
+    INTENT_PROMOTION: re.compile(
+        r"\b(promo|promos|promotion|promotions|special|specials|deal|deals|offer|offers)\b"
+    ),
+    INTENT_AVAILABILITY: re.compile(
+        r"\b(available|availability|in stock|serving|serve|do you have)\b"
+    ),
+    INTENT_FORGET: re.compile(
+        r"\b(forget|delete|erase|reset|clear)\b.*\b(preferences|memories|everything|data|about me)\b"
+    ),
+}
+# A second clause or question ("is the latte lux available and how much is it?")
+# asks for more than one intent, and a template only answers one of them.
+COMPOUND_PATTERN = re.compile(
+    r"(\b(and|or|but|also|plus|then)\s+(also\s+)?|[.!,]\s*)(how|what|what's|which|"
+    r"when|where|why|who|is|are|do|does|can|could|will|would|any|tell|show)\b"
+    r"|[?;]\s*\w"
+)
+NEGATION_PATTERN = re.compile(r"\b(not|never|don't|dont|do not|doesn't|isn't)\b")
+TIME_PATTERN = re.compile(
+    r"\b\d{1,2}(:\d{2})?\s*(am|pm|h)?\b|\b(tomorrow|tonight|yesterday)\b"
+)
+
+INTENT_EXAMPLES = {
+    INTENT_PROMOTION: [
+        "What's today's promotion?",
+        "Is there any special offer today?",
+        "What deals do you have right now?",
+        "Any discount today?",
+    ],
+    INTENT_AVAILABILITY: [
+        "Is the Matcha Zen available now?",
+        "Can I order a Latte Lux right now?",
+        "What drinks are available now?",
+        "Do you have Nitro Noir at the moment?",
+    ],
+    INTENT_FORGET: [
+        "Forget my preferences.",
+        "Please delete everything you know about me.",
+        "Reset my memories.",
+        "Erase my saved preferences.",
+    ],
+}
+
+_centroids: dict[str, np.ndarray] | None = None
+_centroids_lock = asyncio.Lock()
+
+
+async def get_intent_centroids() -> dict[str, np.ndarray]:
+    """Embeds the examples of every intent once and averages them per intent."""
+    global _centroids
+    async with _centroids_lock:
+        if _centroids is None:
+            intents = list(INTENT_EXAMPLES)
+            examples = [
+                example for intent in intents for example in INTENT_EXAMPLES[intent]
+            ]
+            embeddings = await embed_normalized(examples)
+
+            centroids = {}
+            start = 0
+            for intent in intents:
+                end = start + len(INTENT_EXAMPLES[intent])
+                centroid = embeddings[start:end].mean(axis=0)
+                centroids[intent] = centroid / np.linalg.norm(centroid)
+                start = end
+            _centroids = centroids
+        return _centroids
+
+
+def find_drink(text: str) -> str | None:
+    """Returns the drink of the availability schedule mentioned in a request."""
+    for drink in availability_index.drinks():
+        if re.search(rf"\b{re.escape(drink.lower())}\b", text):
+            return drink
+    return None
+
+
+async def classify_intent(text: str) -> str | None:
+    """
+    Returns the intent of a short request, or None when it is not confident. The
+    request must ask one thing and match the keywords of an intent, and its
+    embedding must be closest to that intent's centroid by at least
+    `FAST_PATH_MIN_MARGIN`, with a cosine similarity of at least
+    `FAST_PATH_MIN_SIMILARITY`.
+    """
+    if (
+        len(text.split()) > FAST_PATH_MAX_WORDS
+        or NEGATION_PATTERN.search(text)
+        or COMPOUND_PATTERN.search(text)
+    ):
+        return None
+    candidates = [
+        intent for intent, pattern in INTENT_PATTERNS.items() if pattern.search(text)
+    ]
+    if not candidates:
+        return None
+
+    centroids = await get_intent_centroids()
+    query = await embed_request(text)
+    similarities = sorted(
+        ((float(centroid @ query), intent) for intent, centroid in centroids.items()),
+        reverse=True,
+    )
+    (best, intent), (runner_up, _) = similarities[0], similarities[1]
+    if (
+        intent not in candidates
+        or best < FAST_PATH_MIN_SIMILARITY
+        or best - runner_up < FAST_PATH_MIN_MARGIN
+    ):
+        return None
+    return intent
+
+
+def answer_promotion(text: str) -> str | None:
+    if TIME_PATTERN.search(text):
+        return None
+    promotion = get_current_promotion(get_today_date())
+    if promotion is None:
+        return "There is no promotion today."
+    return f"Today's promotion is {promotion['name']}: {promotion['deal']}."
+
+
+def answer_availability(text: str) -> str | None:
+    if TIME_PATTERN.search(text):
+        return None
+    now = datetime.datetime.now().strftime("%H:%M")
+    drink = find_drink(text)
+    if drink is None:
+        if re.search(r"\b(what|which)\b", text) is None:
+            return None
+        drinks = check_availability_coffee(now)
+        if not drinks:
+            return "No drinks are available right now."
+        return f"Available right now: {', '.join(drinks)}."
+
+    availability = is_coffee_available(drink, now)
+    window = availability.get("window")
+    if "error" in availability or window is None:
+        return None
+    if availability["available"]:
+        return f"Yes, {drink} is available now, until {window['until']}."
+    day = "tomorrow " if window["from"] < now else ""
+    return (
+        f"{drink} is not available right now. It is served next {day}from "
+        f"{window['from']} until {window['until']}."
+    )
+
+
+def answer_forget(text: str) -> str | None:
+    result = forget_user_memories(DEFAULT_USER_ID)
+    if result.startswith("Error"):
+        return None
+    return "Done, I have forgotten all your preferences."
+
+
+INTENT_HANDLERS = {
+    INTENT_PROMOTION: answer_promotion,
+    INTENT_AVAILABILITY: answer_availability,
+    INTENT_FORGET: answer_forget,
+}
+
+
+async def answer_fast_path(callback_context: CallbackContext) -> types.Content | None:
+    """
+    Before-agent callback that answers the most common simple requests (today's
+    promotion, whether a drink is available now, forgetting the user's preferences)
+    by calling their tool directly and filling a template, without any model call.
+    Anything it is not confident about returns None and runs the full agent tree, as
+    does any turn after the first, which may refer to earlier ones.
+    """
+    if not FAST_PATH_ENABLED or not is_first_turn(callback_context):
+        return None
+
+    text = normalize_request(get_request_text(callback_context))
+    if not text:
+        return None
+    try:
+        intent = await classify_intent(text)
+        if intent is None:
+            return None
+        reply = await asyncio.to_thread(INTENT_HANDLERS[intent], text)
+    except Exception as e:
+        logging.error(f"An error occurred in the intent fast path: {e}")
+        return None
+
+    if reply is None:
+        return None
+    logging.info(f"Answered the {intent} intent on the fast path: {text}")
+    return types.Content(role="model", parts=[types.Part(text=reply)])
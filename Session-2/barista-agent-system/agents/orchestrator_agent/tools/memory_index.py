@@ -0,0 +1,141 @@
+import hashlib
+import re
+
+import numpy as np
+
+EMBEDDING_DTYPE = np.float16
+# Rough size of a token in characters, used to cap the memories sent to the model.
+CHARS_PER_TOKEN = 4
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def preference_key(preference: str) -> str:
+    """Returns the key of the embedding of a preference in the `embeddings` map."""
+    return hashlib.sha1(preference.encode("utf-8")).hexdigest()[:16]
+
+
+def normalize_preference(preference: str) -> str:
+    return " ".join(WORD_PATTERN.findall(preference.lower()))
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def encode_embedding(embedding: list[float]) -> bytes:
+    """Normalises an embedding and packs it as float16 bytes."""
+    values = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(values)
+    return (values / (norm or 1.0)).astype(EMBEDDING_DTYPE).tobytes()
+
+
+class UserMemories:
+    """
+    The preferences of a user and their embeddings, as one float16 matrix with a
+    row per preference. Rows of preferences saved without an embedding are zero,
+    and `missing` lists those preferences so they can be embedded later.
+    """
+
+    def __init__(self, preferences: list[str], embeddings: dict[str, bytes]):
+        self.preferences = list(preferences)
+        rows = [
+            embeddings.get(preference_key(preference)) for preference in preferences
+        ]
+        dimensionality = next(
+            (len(row) // EMBEDDING_DTYPE().itemsize for row in rows if row), 0
+        )
+        self._matrix = np.zeros((len(rows), dimensionality), dtype=EMBEDDING_DTYPE)
+        self._embedded = np.zeros(len(rows), dtype=bool)
+        for i, row in enumerate(rows):
+            if row and len(row) == self._matrix.shape[1] * self._matrix.itemsize:
+                self._matrix[i] = np.frombuffer(row, dtype=EMBEDDING_DTYPE)
+                self._embedded[i] = True
+        self.missing = [
+            preference
+            for preference, embedded in zip(self.preferences, self._embedded)
+            if not embedded
+        ]
+
+    @classmethod
+    def from_document(cls, data: dict) -> "UserMemories":
+        return cls(data.get("preferences", []), data.get("embeddings") or {})
+
+    def embeddings(self) -> dict[str, bytes]:
+        return {
+            preference_key(preference): self._matrix[i].tobytes()
+            for i, preference in enumerate(self.preferences)
+            if self._embedded[i]
+        }
+
+    def nbytes(self) -> int:
+        return self._matrix.nbytes
+
+    def document_bytes(self) -> int:
+        """Approximate size of the preferences and embeddings stored for the user."""
+        return sum(
+            len(preference.encode("utf-8")) for preference in self.preferences
+        ) + (int(self._embedded.sum()) * self._matrix.shape[1] * self._matrix.itemsize)
+
+    def compact(self, similarity: float | None = None) -> "UserMemories":
+        """
+        Drops duplicate preferences: the ones that are the same words (ignoring case
+        and punctuation) and, if `similarity` is given, the ones whose embeddings have
+        a cosine similarity of at least `similarity`. Preferences are visited newest
+        first, so the newest of each cluster is kept, which also keeps the latest of
+        two conflicting facts. Preferences without an embedding are only compared by
+        their words.
+        """
+        kept: list[int] = []
+        embedded: list[int] = []
+        seen = set()
+        matrix = self._matrix.astype(np.float32)
+        for i in reversed(range(len(self.preferences))):
+            words = normalize_preference(self.preferences[i])
+            if words in seen:
+                continue
+            if similarity is not None and self._embedded[i] and embedded:
+                if (matrix[embedded] @ matrix[i]).max() >= similarity:
+                    continue
+            kept.append(i)
+            seen.add(words)
+            if self._embedded[i]:
+                embedded.append(i)
+
+        kept.reverse()
+        return UserMemories(
+            [self.preferences[i] for i in kept],
+            {
+                preference_key(self.preferences[i]): self._matrix[i].tobytes()
+                for i in embedded
+            },
+        )
+
+    def recent(self, max_tokens: int) -> list[str]:
+        """Returns the most recent preferences that fit in `max_tokens`, oldest first."""
+        selected = []
+        for preference in reversed(self.preferences):
+            max_tokens -= estimate_tokens(preference)
+            if max_tokens < 0:
+                break
+            selected.append(preference)
+        return selected[::-1]
+
+    def top_k(
+        self, query_embedding: list[float], limit: int, max_tokens: int
+    ) -> list[str]:
+        """
+        Returns up to `limit` preferences ranked by cosine similarity to the query,
+        stopping before they add up to more than `max_tokens`.
+        """
+        if not self.preferences or self._matrix.shape[1] != len(query_embedding):
+            return self.recent(max_tokens)[-limit:] if limit > 0 else []
+
+        query = np.frombuffer(encode_embedding(query_embedding), dtype=EMBEDDING_DTYPE)
+        similarities = self._matrix.astype(np.float32) @ query.astype(np.float32)
+        selected = []
+        for i in np.argsort(-similarities, kind="stable")[:limit]:
+            max_tokens -= estimate_tokens(self.preferences[i])
+            if max_tokens < 0:
+                break
+            selected.append(self.preferences[i])
+        return selected
@@ -0,0 +1,375 @@
+import logging
+import threading
+import time
+
+from google.cloud import firestore
+
+from .memory_index import preference_key
+from .memory_index import UserMemories
+
+MAX_BATCH_WRITES = 500
+
+
+def merge_pending(older: dict, newer: dict) -> dict:
+    """Combines two pending writes of a user, `newer` applied after `older`."""
+    if newer["replace"]:
+        return newer
+    preferences = older["preferences"] + [
+        preference
+        for preference in newer["preferences"]
+        if preference not in older["preferences"]
+    ]
+    return {
+        "replace": older["replace"],
+        "preferences": preferences,
+        "embeddings": {**older["embeddings"], **newer["embeddings"]},
+    }
+
+
+def apply_write(memories: UserMemories | None, write: dict) -> UserMemories | None:
+    """
+    Applies a pending write to the memories of a user, None meaning that the user
+    has no document. A forget is a replace with no preferences.
+    """
+    if write["replace"]:
+        if not write["preferences"]:
+            return None
+        return UserMemories(write["preferences"], write["embeddings"])
+    if memories is None and not write["preferences"]:
+        return None
+
+    merged = merge_pending(
+        {
+            "replace": True,
+            "preferences": memories.preferences if memories else [],
+            "embeddings": memories.embeddings() if memories else {},
+        },
+        write,
+    )
+    return UserMemories(merged["preferences"], merged["embeddings"])
+
+
+class UserMemoryStore:
+    """
+    Read-through cache and write-behind buffer in front of the user memories
+    collection.
+
+    Reads are served from a per-user cache for `ttl_seconds` and fall through to
+    Firestore on a miss, and hold each user's preferences with their embeddings as
+    `UserMemories`. Saved preferences and forgets update the cache right away
+    and are buffered per user; a background thread flushes them in batches every
+    `flush_interval_seconds`, or sooner once `flush_size` users are pending. New
+    preferences are written with `ArrayUnion` and their embeddings merged into the
+    `embeddings` map, and a forget deletes the document.
+    Writes that fail stay buffered, and `close` flushes what is left at shutdown.
+
+    Users that gained more than `compact_size` preferences since their last
+    compaction (or since they were created) are compacted by the same
+    thread: duplicates (the same words, or a cosine similarity of at least
+    `duplicate_similarity` if it is set) are merged into the newest one and the
+    document is rewritten in a transaction.
+    With `compact_interval_seconds` set, every user is also compacted on that
+    schedule.
+    """
+
+    def __init__(
+        self,
+        db: firestore.Client,
+        collection: str,
+        ttl_seconds: float,
+        flush_size: int,
+        flush_interval_seconds: float,
+        duplicate_similarity: float | None,
+        compact_size: int,
+        compact_interval_seconds: float = 0,
+    ):
+        self._collection = db.collection(collection)
+        self._db = db
+        self.ttl_seconds = ttl_seconds
+        self.flush_size = flush_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.duplicate_similarity = duplicate_similarity
+        self.compact_size = compact_size
+        self.compact_interval_seconds = compact_interval_seconds
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._cache: dict[str, tuple[float, UserMemories | None]] = {}
+        self._pending: dict[str, dict] = {}
+        self._in_flight: dict[str, dict] = {}
+        self._compact_users: set[str] = set()
+        self._compacted_sizes: dict[str, int] = {}
+        self._next_compact_all = time.monotonic() + compact_interval_seconds
+        self._generation = 0
+        self._wake = threading.Event()
+        self._closed = False
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "flushes": 0,
+            "flushed_users": 0,
+            "compactions": 0,
+            "compacted_preferences": 0,
+            "compacted_bytes": 0,
+        }
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def get(self, user_id: str) -> UserMemories | None:
+        """
+        Returns the memories of a user, or None for a user with no document.
+        """
+        with self._lock:
+            entry = self._cache.get(user_id)
+            if entry is not None and entry[0] > time.monotonic():
+                self._counters["hits"] += 1
+                return entry[1]
+            self._counters["misses"] += 1
+
+        while True:
+            with self._lock:
+                generation = self._generation
+
+            doc = self._collection.document(user_id).get()
+            stored = (
+                UserMemories.from_document(doc.to_dict() or {}) if doc.exists else None
+            )
+
+            with self._lock:
+                # A batch committed during the read may be missing from it.
+                if generation != self._generation:
+                    continue
+
+                memories = stored
+                for write in (
+                    self._in_flight.get(user_id),
+                    self._pending.get(user_id),
+                ):
+                    if write is not None:
+                        memories = apply_write(memories, write)
+                self._cache[user_id] = (time.monotonic() + self.ttl_seconds, memories)
+                self._check_size(user_id, memories)
+                return memories
+
+    def add(
+        self, user_id: str, preference: str, embedding: bytes | None = None
+    ) -> None:
+        embeddings = {preference_key(preference): embedding} if embedding else {}
+        self._write(
+            user_id,
+            {"replace": False, "preferences": [preference], "embeddings": embeddings},
+        )
+
+    def add_embeddings(self, user_id: str, embeddings: dict[str, bytes]) -> None:
+        """Stores embeddings computed later for preferences saved without one."""
+        self._write(
+            user_id, {"replace": False, "preferences": [], "embeddings": embeddings}
+        )
+
+    def forget(self, user_id: str) -> None:
+        self._write(user_id, {"replace": True, "preferences": [], "embeddings": {}})
+
+    def flush(self) -> None:
+        """Writes the buffered changes to Firestore in batches."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._in_flight = pending
+            if not pending:
+                return
+
+            users = list(pending.items())
+            for start in range(0, len(users), MAX_BATCH_WRITES):
+                chunk = users[start : start + MAX_BATCH_WRITES]
+                try:
+                    batch = self._db.batch()
+                    for user_id, write in chunk:
+                        user_ref = self._collection.document(user_id)
+                        if write["replace"] and not write["preferences"]:
+                            batch.delete(user_ref)
+                        elif write["replace"]:
+                            batch.set(
+                                user_ref,
+                                {
+                                    "preferences": write["preferences"],
+                                    "embeddings": write["embeddings"],
+                                },
+                            )
+                        else:
+                            fields = {}
+                            if write["preferences"]:
+                                fields["preferences"] = firestore.ArrayUnion(
+                                    write["preferences"]
+                                )
+                            if write["embeddings"]:
+                                fields["embeddings"] = write["embeddings"]
+                            batch.set(user_ref, fields, merge=True)
+                    batch.commit()
+                    with self._lock:
+                        self._generation += 1
+                        self._counters["flushes"] += 1
+                        self._counters["flushed_users"] += len(chunk)
+                except Exception as e:
+                    logging.error(f"An error occurred flushing user memories: {e}")
+                    with self._lock:
+                        for user_id, write in chunk:
+                            newer = self._pending.get(user_id)
+                            self._pending[user_id] = (
+                                merge_pending(write, newer) if newer else write
+                            )
+
+            with self._lock:
+                self._in_flight = {}
+
+    def compact(self, user_id: str) -> dict | None:
+        """
+        Flushes the buffered writes and rewrites the document of a user without its
+        near-duplicate preferences, in a transaction so that concurrent writes are
+        not lost.
+
+        Returns:
+            dict | None: The number of preferences and approximate bytes before and
+            after, or None for a user with no document.
+        """
+        self.flush()
+        user_ref = self._collection.document(user_id)
+
+        @firestore.transactional
+        def rewrite(transaction) -> tuple[UserMemories, UserMemories] | None:
+            snapshot = user_ref.get(transaction=transaction)
+            if not snapshot.exists:
+                return None
+            memories = UserMemories.from_document(snapshot.to_dict() or {})
+            compacted = memories.compact(self.duplicate_similarity)
+            if len(compacted.preferences) < len(memories.preferences):
+                transaction.set(
+                    user_ref,
+                    {
+                        "preferences": compacted.preferences,
+                        "embeddings": compacted.embeddings(),
+                    },
+                )
+            return memories, compacted
+
+        result = rewrite(self._db.transaction())
+        with self._lock:
+            self._compact_users.discard(user_id)
+            if result is None:
+                return None
+
+            memories, compacted = result
+            self._compacted_sizes[user_id] = len(compacted.preferences)
+            report = {
+                "preferences_before": len(memories.preferences),
+                "preferences_after": len(compacted.preferences),
+                "bytes_before": memories.document_bytes(),
+                "bytes_after": compacted.document_bytes(),
+            }
+            if report["preferences_after"] < report["preferences_before"]:
+                self._generation += 1
+                self._cache.pop(user_id, None)
+                self._counters["compactions"] += 1
+                self._counters["compacted_preferences"] += (
+                    report["preferences_before"] - report["preferences_after"]
+                )
+                self._counters["compacted_bytes"] += (
+                    report["bytes_before"] - report["bytes_after"]
+                )
+
+        logging.info(f"Compacted the memories of {user_id}: {report}")
+        return report
+
+    def compact_all(self) -> dict:
+        """Compacts every user of the collection and returns the totals."""
+        summary = {
+            "users": 0,
+            "compacted_users": 0,
+            "preferences_before": 0,
+            "preferences_after": 0,
+            "bytes_before": 0,
+            "bytes_after": 0,
+        }
+        for user_ref in self._collection.list_documents():
+            report = self.compact(user_ref.id)
+            if report is None:
+                continue
+            summary["users"] += 1
+            if report["preferences_after"] < report["preferences_before"]:
+                summary["compacted_users"] += 1
+            for field, value in report.items():
+                summary[field] += value
+
+        logging.info(f"Compacted the user memories: {summary}")
+        return summary
+
+    def close(self) -> None:
+        """Stops the flush thread and writes the buffered changes."""
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._counters,
+                "cached_users": len(self._cache),
+                "pending_users": len(self._pending),
+                "compact_users": len(self._compact_users),
+            }
+
+    def _write(self, user_id: str, write: dict) -> None:
+        with self._lock:
+            pending = self._pending.get(user_id)
+            self._pending[user_id] = merge_pending(pending, write) if pending else write
+
+            # Without a cached entry the stored preferences are unknown, so only a
+            # forget can be cached; the next read merges the pending write.
+            entry = self._cache.get(user_id)
+            if entry is not None or write["replace"]:
+                memories = apply_write(entry[1] if entry is not None else None, write)
+                self._cache[user_id] = (time.monotonic() + self.ttl_seconds, memories)
+                self._check_size(user_id, memories)
+
+            if len(self._pending) >= self.flush_size:
+                self._wake.set()
+
+    def _check_size(self, user_id: str, memories: UserMemories | None) -> None:
+        """Queues a user for compaction once it grew by more than `compact_size`."""
+        if memories is None:
+            return
+        size = self._compacted_sizes.get(user_id, 0) + self.compact_size
+        if len(memories.preferences) > size:
+            if user_id not in self._compact_users:
+                self._compact_users.add(user_id)
+                self._wake.set()
+
+    def _run(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.flush_interval_seconds)
+            self._wake.clear()
+            if self._closed:
+                break
+            self.flush()
+
+            with self._lock:
+                users = list(self._compact_users)
+            for user_id in users:
+                try:
+                    self.compact(user_id)
+                except Exception as e:
+                    logging.error(f"An error occurred compacting {user_id}: {e}")
+                    with self._lock:
+                        self._compact_users.discard(user_id)
+
+            try:
+                if (
+                    self.compact_interval_seconds
+                    and time.monotonic() >= self._next_compact_all
+                ):
+                    self._next_compact_all = (
+                        time.monotonic() + self.compact_interval_seconds
+                    )
+                    self.compact_all()
+            except Exception as e:
+                logging.error(f"An error occurred compacting user memories: {e}")
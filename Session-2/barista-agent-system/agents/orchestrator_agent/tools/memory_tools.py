@@ -1,12 +1,87 @@
+import asyncio
+import atexit
+import functools
+import logging
+import os
+
+from google import genai
 from google.cloud import firestore
+from google.genai import types
+
+from .memory_index import encode_embedding
+from .memory_index import preference_key
+from .memory_store import UserMemoryStore
 
 DATABASE_NAME = "embeddings"
 COLLECTION_NAME = "user_memories"
+DEFAULT_USER_ID = "demo_student"
+GEMINI_MODEL_EMBEDDING = "gemini-embedding-001"
+EMBEDDING_DIMENSIONALITY = 768
+# Preferences embedded per call when backfilling the ones saved without a vector.
+MAX_EMBEDDING_BATCH = 100
+MEMORY_TOP_K = int(os.getenv("MEMORY_TOP_K", "5"))
+MEMORY_MAX_TOKENS = int(os.getenv("MEMORY_MAX_TOKENS", "200"))
+MEMORY_CACHE_TTL_SECONDS = float(os.getenv("MEMORY_CACHE_TTL_SECONDS", "300"))
+MEMORY_FLUSH_SIZE = int(os.getenv("MEMORY_FLUSH_SIZE", "50"))
+MEMORY_FLUSH_INTERVAL_SECONDS = float(os.getenv("MEMORY_FLUSH_INTERVAL_SECONDS", "2"))
+# Unset, compaction only merges preferences with the same words: short preferences
+# that differ in one word ("likes oat milk", "likes almond milk") have embeddings too
+# close for a cosine threshold to tell apart.
+MEMORY_DUPLICATE_SIMILARITY = (
+    float(os.environ["MEMORY_DUPLICATE_SIMILARITY"])
+    if os.getenv("MEMORY_DUPLICATE_SIMILARITY")
+    else None
+)
+MEMORY_COMPACT_SIZE = int(os.getenv("MEMORY_COMPACT_SIZE", "20"))
+MEMORY_COMPACT_INTERVAL_SECONDS = float(
+    os.getenv("MEMORY_COMPACT_INTERVAL_SECONDS", "0")
+)
 
 db = firestore.Client(database=DATABASE_NAME)
+memory_store = UserMemoryStore(
+    db,
+    COLLECTION_NAME,
+    ttl_seconds=MEMORY_CACHE_TTL_SECONDS,
+    flush_size=MEMORY_FLUSH_SIZE,
+    flush_interval_seconds=MEMORY_FLUSH_INTERVAL_SECONDS,
+    duplicate_similarity=MEMORY_DUPLICATE_SIMILARITY,
+    compact_size=MEMORY_COMPACT_SIZE,
+    compact_interval_seconds=MEMORY_COMPACT_INTERVAL_SECONDS,
+)
+atexit.register(memory_store.close)
+
+
+@functools.cache
+def get_genai_client() -> genai.Client:
+    return genai.Client()
+
+
+async def embed_texts(texts: list[str], task_type: str) -> list[list[float]]:
+    result = await get_genai_client().aio.models.embed_content(
+        model=GEMINI_MODEL_EMBEDDING,
+        contents=texts,
+        config=types.EmbedContentConfig(
+            task_type=task_type,
+            output_dimensionality=EMBEDDING_DIMENSIONALITY,
+        ),
+    )
+    return [embedding.values for embedding in result.embeddings]
+
 
+async def backfill_embeddings(user_id: str, preferences: list[str]) -> None:
+    """Embeds preferences saved before they were stored with a vector."""
+    preferences = preferences[:MAX_EMBEDDING_BATCH]
+    embeddings = await embed_texts(preferences, "RETRIEVAL_DOCUMENT")
+    memory_store.add_embeddings(
+        user_id,
+        {
+            preference_key(preference): encode_embedding(embedding)
+            for preference, embedding in zip(preferences, embeddings)
+        },
+    )
 
-def save_user_preference(preference: str, user_id: str = "demo_student") -> str:
+
+async def save_user_preference(preference: str, user_id: str = DEFAULT_USER_ID) -> str:
     """
     Saves a specific fact or preference about the user into the database.
     Useful when the user says "I am vegan", "I love chocolate", etc.
@@ -16,43 +91,63 @@ def save_user_preference(preference: str, user_id: str = "demo_student") -> str:
         user_id (str): The ID of the user (defaults to 'demo_student' for the workshop).
     """
     try:
-        user_ref = db.collection(COLLECTION_NAME).document(user_id)
-        user_ref.set({
-            "preferences": firestore.ArrayUnion([preference])
-        }, merge=True)
+        embedding = None
+        try:
+            [values] = await embed_texts([preference], "RETRIEVAL_DOCUMENT")
+            embedding = encode_embedding(values)
+        except Exception as e:
+            # The preference is still saved; it is embedded on a later retrieval.
+            logging.error(f"An error occurred embedding a user preference: {e}")
 
+        memory_store.add(user_id, preference, embedding)
         return f"Memory saved: '{preference}'"
     except Exception as e:
         return f"Error saving memory: {str(e)}"
 
 
-def get_user_memories(user_id: str = "demo_student") -> str:
+async def get_user_memories(user_id: str = DEFAULT_USER_ID, request: str = "") -> str:
     """
-    Retrieves all stored preferences for the user. 
+    Retrieves the stored preferences of the user that are most relevant to the current request.
     Call this tool to know the user's context before making a recommendation.
+
+    Args:
+        user_id (str): The ID of the user (defaults to 'demo_student' for the workshop).
+        request (str): The user's current request (e.g., "Recommend me a cold drink"). Without it, the most recent preferences are returned.
     """
     try:
-        user_ref = db.collection(COLLECTION_NAME).document(user_id)
-        doc = user_ref.get()
-
-        if doc.exists:
-            prefs = doc.to_dict().get("preferences", [])
-            if not prefs:
-                return "No memories found for this user."
-            return f"User Memories: {', '.join(prefs)}"
-        else:
+        memories = await asyncio.to_thread(memory_store.get, user_id)
+
+        if memories is None:
             return "No memories found (New User)."
+        if not memories.preferences:
+            return "No memories found for this user."
+
+        prefs = memories.recent(MEMORY_MAX_TOKENS)[-MEMORY_TOP_K:]
+        if request:
+            try:
+                if memories.missing:
+                    await backfill_embeddings(user_id, memories.missing)
+                    memories = (
+                        await asyncio.to_thread(memory_store.get, user_id) or memories
+                    )
+                [query_embedding] = await embed_texts([request], "RETRIEVAL_QUERY")
+                prefs = memories.top_k(query_embedding, MEMORY_TOP_K, MEMORY_MAX_TOKENS)
+            except Exception as e:
+                # Falls back to the most recent preferences.
+                logging.error(f"An error occurred ranking user memories: {e}")
+
+        return f"User Memories: {', '.join(prefs)}"
     except Exception as e:
         return f"Error fetching memories: {str(e)}"
 
 
-def forget_user_memories(user_id: str = "demo_student") -> str:
+def forget_user_memories(user_id: str = DEFAULT_USER_ID) -> str:
     """
-    Deletes all stored memories for the user. 
+    Deletes all stored memories for the user.
     Use this when the user asks to "forget everything" or "reset my preferences".
     """
     try:
-        db.collection(COLLECTION_NAME).document(user_id).delete()
+        memory_store.forget(user_id)
         return "All memories for this user have been deleted."
     except Exception as e:
         return f"Error deleting memories: {str(e)}"
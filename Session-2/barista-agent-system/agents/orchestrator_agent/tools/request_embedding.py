@@ -0,0 +1,39 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from .memory_tools import embed_texts
+
+EMBEDDING_TASK_TYPE = "SEMANTIC_SIMILARITY"
+REQUEST_EMBEDDING_CACHE_SIZE = 256
+
+_request_embeddings: OrderedDict[str, np.ndarray] = OrderedDict()
+
+
+def normalize_request(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+async def embed_normalized(texts: list[str]) -> np.ndarray:
+    """Embeds texts for similarity search, as rows of unit length."""
+    embeddings = np.asarray(
+        await embed_texts(texts, EMBEDDING_TASK_TYPE), dtype=np.float32
+    )
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.where(norms == 0, 1.0, norms)
+
+
+async def embed_request(text: str) -> np.ndarray:
+    """
+    Embeds a normalised user request. The intent fast path and the specialist
+    router both score the same request, so recent embeddings are kept in an LRU
+    cache and a turn makes at most one embedding call.
+    """
+    embedding = _request_embeddings.get(text)
+    if embedding is None:
+        [embedding] = await embed_normalized([text])
+        _request_embeddings[text] = embedding
+        if len(_request_embeddings) > REQUEST_EMBEDDING_CACHE_SIZE:
+            _request_embeddings.popitem(last=False)
+    _request_embeddings.move_to_end(text)
+    return embedding
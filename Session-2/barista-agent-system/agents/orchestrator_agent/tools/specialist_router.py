@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import os
+import re
+
+import numpy as np
+from creative_director_agent import creative_director_agent
+from google.adk.agents.callback_context import CallbackContext
+from google.genai import types
+from head_barista_agent import head_barista_agent
+from market_analyst_agent import market_analyst_agent
+
+from .context_prefetch import get_request_text
+from .context_prefetch import is_first_turn
+from .dispatch_tools import ask_specialist
+from .request_embedding import embed_normalized
+from .request_embedding import embed_request
+from .request_embedding import normalize_request
+
+ROUTER_ENABLED = os.getenv("ROUTER_ENABLED", "true").lower() == "true"
+ROUTER_MIN_SIMILARITY = float(os.getenv("ROUTER_MIN_SIMILARITY", "0.7"))
+ROUTER_MIN_MARGIN = float(os.getenv("ROUTER_MIN_MARGIN", "0.08"))
+# A routed request that fails or misses this deadline is run again by the
+# orchestrator model, so the time spent on it adds to the turn.
+ROUTER_DEADLINE_SECONDS = float(os.getenv("ROUTER_DEADLINE_SECONDS", "10"))
+
+# Turns where the user states a preference or a fact about themselves, or asks to
+# remember or forget one, need the orchestrator's memory tools, so they are never
+# routed, e.g. "I'm vegan, what should I drink?".
+MEMORY_PATTERN = re.compile(
+    r"\b(i'?m|i am|i like|i love|i hate|i prefer|i don'?t|i do not|i can'?t|"
+    r"i cannot|i never|i always|i usually|my favou?rite|allergic|intolerant|vegan|"
+    r"vegetarian|remember|forget|keep in mind|from now on|note that|"
+    r"al[eé]rgic[oa]|me gusta|prefiero|recuerda|olvida)\b"
+)
+LANGUAGE_NOTE = "Answer in the language of this request."
+
+# Requests that stand for what each specialist handles, scored together with the
+# specialist's description.
+ROUTE_EXAMPLES = {
+    head_barista_agent.name: [
+        "What's on the menu?",
+        "How much is a Latte Lux?",
+        "What ingredients are in the Mocha Magic?",
+        "Is the Cold Brew Breeze available at 3 pm?",
+        "Which drinks are dairy free?",
+        "Do you have anything with oat milk?",
+    ],
+    creative_director_agent.name: [
+        "Hi!",
+        "Hello, good morning",
+        "Show me a picture of a cappuccino",
+        "Generate an image of an iced caramel latte",
+        "What promotions do you have this week?",
+        "Are there any discounts?",
+    ],
+    market_analyst_agent.name: [
+        "What do you recommend?",
+        "What should I drink?",
+        "What's the most popular coffee right now?",
+        "Which drinks are trending?",
+        "What is the best coffee for me?",
+    ],
+}
+ROUTE_DESCRIPTIONS = {
+    agent.name: agent.description
+    for agent in (head_barista_agent, creative_director_agent, market_analyst_agent)
+}
+
+_routes: list[tuple[str, np.ndarray]] | None = None
+_routes_lock = asyncio.Lock()
+
+
+async def get_routes() -> list[tuple[str, np.ndarray]]:
+    """
+    Embeds the description and examples of every specialist once, as one matrix
+    per specialist.
+    """
+    global _routes
+    async with _routes_lock:
+        if _routes is None:
+            texts = {
+                name: [ROUTE_DESCRIPTIONS[name], *examples]
+                for name, examples in ROUTE_EXAMPLES.items()
+            }
+            embeddings = await embed_normalized(
+                [text for name in texts for text in texts[name]]
+            )
+
+            routes = []
+            start = 0
+            for name, route_texts in texts.items():
+                routes.append((name, embeddings[start : start + len(route_texts)]))
+                start += len(route_texts)
+            _routes = routes
+        return _routes
+
+
+async def route_request(text: str) -> str | None:
+    """
+    Returns the specialist closest to a request, or None when the request is
+    ambiguous. A specialist scores the highest cosine similarity between the request
+    and its description or examples; the best one must score at least
+    `ROUTER_MIN_SIMILARITY` and beat the next one by `ROUTER_MIN_MARGIN`.
+    """
+    routes = await get_routes()
+    query = await embed_request(text)
+    scores = sorted(
+        ((float((matrix @ query).max()), name) for name, matrix in routes),
+        reverse=True,
+    )
+    (best, name), (runner_up, _) = scores[0], scores[1]
+    if best < ROUTER_MIN_SIMILARITY or best - runner_up < ROUTER_MIN_MARGIN:
+        return None
+    return name
+
+
+async def route_to_specialist(
+    callback_context: CallbackContext,
+) -> types.Content | None:
+    """
+    Before-agent callback that sends a request straight to the specialist it is
+    closest to by embedding similarity, and replies with the specialist's answer,
+    without the orchestrator model choosing the route. The prefetched user memories
+    are passed along, and the specialist is asked to answer in the language of the
+    request. Turns after the first of a session, which may refer to earlier ones,
+    turns that state a preference or ask to remember or forget one, ambiguous
+    requests, and specialists that fail or miss `ROUTER_DEADLINE_SECONDS` return
+    None so that the orchestrator model handles the turn.
+    """
+    if not ROUTER_ENABLED or not is_first_turn(callback_context):
+        return None
+
+    text = get_request_text(callback_context)
+    normalized = normalize_request(text)
+    if not normalized or MEMORY_PATTERN.search(normalized):
+        return None
+    try:
+        specialist = await route_request(normalized)
+    except Exception as e:
+        logging.error(f"An error occurred routing the request: {e}")
+        return None
+    if specialist is None:
+        return None
+
+    request = f"{text}\n\n{LANGUAGE_NOTE}"
+    memories = callback_context.state.get("user_memories", "")
+    if memories.startswith("User Memories:"):
+        request = f"{request}\n\n{memories}"
+
+    result = await ask_specialist(
+        specialist, request, callback_context, ROUTER_DEADLINE_SECONDS
+    )
+    answer = result.get("answer")
+    if not answer:
+        logging.warning(
+            f"Routing to {specialist} failed after {result['seconds']}s, falling back "
+            f"to the orchestrator: {result.get('error', 'empty answer')}"
+        )
+        return None
+    logging.info(f"Routed to {specialist} in {result['seconds']}s: {text}")
+    return types.Content(role="model", parts=[types.Part(text=str(answer))])
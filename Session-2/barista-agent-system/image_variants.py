@@ -0,0 +1,65 @@
+import functools
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+IMAGE_VARIANT_WORKERS = int(os.getenv("IMAGE_VARIANT_WORKERS", "2"))
+ORIGINAL_VARIANT = "original"
+
+# Variant name -> (maximum width and height in pixels, WebP quality).
+WEBP_VARIANTS: dict[str, tuple[int | None, int]] = {
+    "full": (None, 85),
+    "medium": (640, 80),
+    "thumbnail": (320, 75),
+}
+
+
+def variant_object_names(prefix: str) -> dict[str, str]:
+    """Returns the Cloud Storage object of every variant of an image, by name."""
+    return {
+        ORIGINAL_VARIANT: f"{prefix}/{ORIGINAL_VARIANT}.png",
+        **{name: f"{prefix}/{name}.webp" for name in WEBP_VARIANTS},
+    }
+
+
+def render_variants(image_bytes: bytes) -> dict[str, bytes]:
+    """
+    Decodes an image once and encodes each of the `WEBP_VARIANTS`, scaled down to
+    fit its size, plus a PNG `ORIGINAL_VARIANT` if the image is not a PNG already.
+    It runs in a worker process, so it only takes and returns bytes.
+    """
+    with Image.open(io.BytesIO(image_bytes)) as decoded:
+        decoded.load()
+        variants = {}
+        if decoded.format != "PNG":
+            output = io.BytesIO()
+            decoded.save(output, format="PNG")
+            variants[ORIGINAL_VARIANT] = output.getvalue()
+
+        image: Image.Image = decoded
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+        for name, (size, quality) in WEBP_VARIANTS.items():
+            variant = image
+            if size is not None and max(image.size) > size:
+                variant = image.copy()
+                variant.thumbnail((size, size), Image.Resampling.LANCZOS)
+
+            output = io.BytesIO()
+            variant.save(output, format="WEBP", quality=quality, method=4)
+            variants[name] = output.getvalue()
+        return variants
+
+
+@functools.cache
+def get_variant_pool() -> ProcessPoolExecutor:
+    # The server runs threads (the event loop, job and upload pools), which a
+    # forked worker could inherit mid-operation, so workers are spawned instead.
+    return ProcessPoolExecutor(
+        max_workers=IMAGE_VARIANT_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
@@ -7,12 +7,14 @@ AGENT_DIR = os.path.dirname(os.path.abspath(__file__))
 SESSION_DB_URL = "sqlite:///./sessions.db"
 ALLOWED_ORIGINS = ["http://localhost", "http://localhost:8080", "*"]
 SERVE_WEB_INTERFACE = True
+EXTRA_PLUGINS = ["response_cache.ResponseCachePlugin"]
 
 app = get_fast_api_app(
     agents_dir=AGENT_DIR,
     session_service_uri=SESSION_DB_URL,
     allow_origins=ALLOWED_ORIGINS,
     web=SERVE_WEB_INTERFACE,
+    extra_plugins=EXTRA_PLUGINS,
 )
 
 if __name__ == "__main__":
@@ -0,0 +1,243 @@
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest
+from google.adk.models import LlmResponse
+from google.adk.models.registry import LLMRegistry
+from google.genai import types
+
+TIER_FAST = "fast"
+TIER_STANDARD = "standard"
+TIER_STRONG = "strong"
+TIERS = [TIER_FAST, TIER_STANDARD, TIER_STRONG]
+
+
+# Role -> (starting tier, latency budget of a model call in milliseconds).
+ROLE_TIERS = {
+    "router": (TIER_FAST, 2000),
+    "lookup": (TIER_FAST, 4000),
+    "creative": (TIER_STANDARD, 8000),
+    "analyst": (TIER_STANDARD, 10000),
+}
+
+HIGH_COMPLEXITY = 0.6
+LONG_PROMPT_TOKENS = 8000
+CHARS_PER_TOKEN = 4
+LATENCY_SMOOTHING = 0.2
+# Calls whose after callback never ran (e.g. the model raised) are dropped past this.
+MAX_PENDING_CALLS = 1024
+STATS_LOG_EVERY = int(os.getenv("MODEL_TIER_STATS_LOG_EVERY", "50"))
+
+COMPLEX_PATTERN = re.compile(
+    r"\b(compare|comparison|why|explain|plan|versus|vs|difference|recommend|"
+    r"suggest|pairing|trend|trends|analy[sz]e)\b"
+)
+CONJUNCTION_PATTERN = re.compile(r"\b(and|also|then|plus)\b")
+
+
+def load_tier_models(default_model: str) -> dict[str, str]:
+    """Returns the model of each tier; the standard tier defaults to the agent's."""
+    return {
+        TIER_FAST: os.getenv("MODEL_TIER_FAST", "gemini-2.5-flash-lite"),
+        TIER_STANDARD: os.getenv("MODEL_TIER_STANDARD", default_model),
+        TIER_STRONG: os.getenv("MODEL_TIER_STRONG", "gemini-2.5-pro"),
+    }
+
+
+def estimate_complexity(text: str) -> float:
+    """
+    Scores a request from 0 (a single lookup) to 1 (long, multi-part or analytical)
+    from its length, its analytical words, and how many questions it chains.
+    """
+    text = text.lower()
+    score = min(len(text.split()) / 40, 1.0)
+    score += 0.3 * len(COMPLEX_PATTERN.findall(text))
+    score += 0.2 * max(text.count("?") - 1, 0)
+    score += 0.15 * len(CONJUNCTION_PATTERN.findall(text))
+    return min(score, 1.0)
+
+
+def estimate_prompt_tokens(llm_request: LlmRequest) -> int:
+    chars = len(str(llm_request.config.system_instruction or ""))
+    for content in llm_request.contents:
+        for part in content.parts or []:
+            chars += len(part.text or "")
+            if part.function_response is not None:
+                chars += len(str(part.function_response.response))
+    return chars // CHARS_PER_TOKEN
+
+
+def is_formatting_step(llm_request: LlmRequest) -> bool:
+    """Whether the model is only turning tool results into the reply."""
+    if not llm_request.contents:
+        return False
+    parts = llm_request.contents[-1].parts or []
+    return bool(parts) and all(part.function_response for part in parts)
+
+
+def validate_response(llm_response: LlmResponse) -> str | None:
+    """Returns why a model response is not usable, or None if it is."""
+    if llm_response.error_code:
+        return f"error {llm_response.error_code}"
+    if llm_response.finish_reason == types.FinishReason.MALFORMED_FUNCTION_CALL:
+        return "malformed function call"
+    parts = (llm_response.content.parts if llm_response.content else None) or []
+    if not any(part.function_call or (part.text or "").strip() for part in parts):
+        return "empty response"
+    return None
+
+
+class TierStats:
+    """Counts the calls, escalations and latency of each tier."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._tiers = {
+            tier: {"calls": 0, "escalations": 0, "total_ms": 0.0, "avg_ms": None}
+            for tier in TIERS
+        }
+
+    def expected_latency_ms(self, tier: str) -> float | None:
+        with self._lock:
+            return self._tiers[tier]["avg_ms"]
+
+    def record(self, tier: str, latency_ms: float, escalated: bool) -> None:
+        with self._lock:
+            stats = self._tiers[tier]
+            stats["calls"] += 1
+            stats["escalations"] += int(escalated)
+            stats["total_ms"] += latency_ms
+            stats["avg_ms"] = (
+                latency_ms
+                if stats["avg_ms"] is None
+                else stats["avg_ms"]
+                + LATENCY_SMOOTHING * (latency_ms - stats["avg_ms"])
+            )
+            self._calls += 1
+            log = STATS_LOG_EVERY and self._calls % STATS_LOG_EVERY == 0
+        if log:
+            logging.info(f"Model tier stats: {self.snapshot()}")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                tier: {
+                    "calls": stats["calls"],
+                    "share": stats["calls"] / self._calls if self._calls else 0.0,
+                    "escalations": stats["escalations"],
+                    "mean_latency_ms": (
+                        round(stats["total_ms"] / stats["calls"])
+                        if stats["calls"]
+                        else None
+                    ),
+                }
+                for tier, stats in self._tiers.items()
+            }
+
+
+tier_stats = TierStats()
+
+
+class ModelTiering:
+    """
+    Picks the model of every call of an agent, as before and after model callbacks.
+
+    Each call starts on the tier of the agent's role. Steps that only format tool
+    results run on the fast tier; otherwise complex requests and long prompts move
+    one tier up. The tier then moves down while its observed latency exceeds the
+    role's budget. A response that fails validation (an error, a malformed function
+    call or an empty reply) is retried on the next tier, up to the strong one.
+    """
+
+    def __init__(self, role: str, default_model: str):
+        self.role = role
+        self.models = load_tier_models(default_model)
+        self.base_tier, self.latency_budget_ms = ROLE_TIERS[role]
+        self._calls: OrderedDict[tuple[str, str], tuple[str, LlmRequest, float]] = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def select_tier(self, request_text: str, llm_request: LlmRequest) -> str:
+        if is_formatting_step(llm_request):
+            return TIER_FAST
+
+        tier = TIERS.index(self.base_tier)
+        if estimate_complexity(request_text) >= HIGH_COMPLEXITY:
+            tier += 1
+        if estimate_prompt_tokens(llm_request) > LONG_PROMPT_TOKENS:
+            tier = max(tier, TIERS.index(TIER_STANDARD))
+        tier = min(tier, len(TIERS) - 1)
+
+        while tier > 0:
+            latency_ms = tier_stats.expected_latency_ms(TIERS[tier])
+            if latency_ms is None or latency_ms <= self.latency_budget_ms:
+                break
+            tier -= 1
+        return TIERS[tier]
+
+    def before_model(
+        self, callback_context: CallbackContext, llm_request: LlmRequest
+    ) -> None:
+        content = callback_context.user_content
+        request_text = " ".join(
+            part.text
+            for part in (content.parts if content else None) or []
+            if part.text
+        )
+        tier = self.select_tier(request_text, llm_request)
+        llm_request.model = self.models[tier]
+        with self._lock:
+            self._calls[self._call_key(callback_context)] = (
+                tier,
+                llm_request,
+                time.monotonic(),
+            )
+            while len(self._calls) > MAX_PENDING_CALLS:
+                self._calls.popitem(last=False)
+        return None
+
+    async def after_model(
+        self, callback_context: CallbackContext, llm_response: LlmResponse
+    ) -> LlmResponse | None:
+        if llm_response.partial:
+            return None
+        with self._lock:
+            call = self._calls.pop(self._call_key(callback_context), None)
+        if call is None:
+            return None
+
+        tier, llm_request, started = call
+        tier_stats.record(tier, (time.monotonic() - started) * 1000, escalated=False)
+
+        failure = validate_response(llm_response)
+        response = None
+        while failure is not None and tier != TIERS[-1]:
+            tier = TIERS[TIERS.index(tier) + 1]
+            logging.warning(
+                f"Escalating {callback_context.agent_name} to the {tier} tier "
+                f"after {failure}"
+            )
+            llm_request.model = self.models[tier]
+            started = time.monotonic()
+            try:
+                async for response in LLMRegistry.new_llm(
+                    self.models[tier]
+                ).generate_content_async(llm_request):
+                    pass
+            except Exception as e:
+                logging.error(f"An error occurred escalating to the {tier} tier: {e}")
+                break
+            tier_stats.record(tier, (time.monotonic() - started) * 1000, escalated=True)
+            failure = validate_response(response) if response else "empty response"
+        return response
+
+    @staticmethod
+    def _call_key(callback_context: CallbackContext) -> tuple[str, str]:
+        return callback_context.invocation_id, callback_context.agent_name
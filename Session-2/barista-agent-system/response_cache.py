@@ -0,0 +1,339 @@
+import asyncio
+import functools
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from creative_director_agent.tools.promotions_tools import get_current_promotion
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event
+from google.adk.plugins.base_plugin import BasePlugin
+from google.cloud import firestore
+from google.genai import types
+from orchestrator_agent.tools.common_tools import get_today_date
+from orchestrator_agent.tools.context_prefetch import is_first_turn
+from orchestrator_agent.tools.memory_tools import DEFAULT_USER_ID
+from orchestrator_agent.tools.memory_tools import memory_store
+from orchestrator_agent.tools.request_embedding import embed_request
+from orchestrator_agent.tools.request_embedding import normalize_request
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_MIN_SIMILARITY = float(
+    os.getenv("RESPONSE_CACHE_MIN_SIMILARITY", "0.95")
+)
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "600"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+STATS_LOG_EVERY = int(os.getenv("RESPONSE_CACHE_STATS_LOG_EVERY", "50"))
+MENU_VERSION_REFRESH_SECONDS = float(
+    os.getenv("RESPONSE_CACHE_MENU_VERSION_SECONDS", "30")
+)
+# The version document the ingestion pipeline bumps after every menu change.
+MENU_DATABASE_NAME = "embeddings"
+MENU_INDEX_COLLECTION = "menu_index"
+MENU_INDEX_STATE_DOCUMENT = "state"
+# Runs whose after callback never ran (e.g. the agent raised) are dropped past this.
+MAX_PENDING_RUNS = 1024
+
+# Turns about the user (their preferences, recommendations for them) or about the
+# current time are answered differently for the same words, so they are neither
+# served from the cache nor stored in it.
+PERSONAL_PATTERN = re.compile(
+    r"\b(my|mine|myself|for me|i like|i love|i hate|i prefer|i'm|i am|"
+    r"favou?rite|prefer|preferences?|usual|remember|forget|recommend|suggest)\b"
+    r"|user memories:"
+)
+TIME_PATTERN = re.compile(
+    r"\b(now|right now|currently|at the moment|open|available|availability|"
+    r"tomorrow|tonight|yesterday)\b|\b\d{1,2}(:\d{2})?\s*(am|pm|h)\b"
+)
+PERSONAL_TOOLS = {"save_user_preference", "get_user_memories", "forget_user_memories"}
+
+
+def is_cacheable(text: str) -> bool:
+    return (
+        bool(text)
+        and not PERSONAL_PATTERN.search(text)
+        and not TIME_PATTERN.search(text)
+    )
+
+
+def get_content_text(content: types.Content | None) -> str:
+    if content is None or not content.parts:
+        return ""
+    return " ".join(part.text for part in content.parts if part.text)
+
+
+@functools.cache
+def get_firestore_client() -> firestore.AsyncClient:
+    return firestore.AsyncClient(database=MENU_DATABASE_NAME)
+
+
+class MenuVersion:
+    """
+    The `version` of the menu state document, read at most every `refresh_seconds`.
+    Only this one field is read, so the cache does not need the menu index itself.
+    """
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._version: int | None = None
+        self._checked_at: float | None = None
+        self._lock = asyncio.Lock()
+
+    async def get(self) -> int | None:
+        async with self._lock:
+            if (
+                self._checked_at is None
+                or time.monotonic() - self._checked_at >= self.refresh_seconds
+            ):
+                doc = (
+                    await get_firestore_client()
+                    .collection(MENU_INDEX_COLLECTION)
+                    .document(MENU_INDEX_STATE_DOCUMENT)
+                    .get()
+                )
+                self._version = doc.get("version") if doc.exists else None
+                self._checked_at = time.monotonic()
+            return self._version
+
+
+class ResponseCache:
+    """
+    Replies of past turns, keyed by the agent, a fingerprint of the state the reply
+    depends on, and the normalised request.
+
+    A lookup first tries the exact request, which needs no embedding call, and then
+    the entry of the same agent and fingerprint whose request embedding is closest,
+    if its cosine similarity is at least `min_similarity`. Entries expire after
+    `ttl_seconds`, and the least recently used ones are evicted past `max_entries`.
+    """
+
+    def __init__(self, min_similarity: float, ttl_seconds: float, max_entries: int):
+        self.min_similarity = min_similarity
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[
+            tuple[tuple, str], tuple[np.ndarray | None, types.Content, float]
+        ] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def has_entries(self, key: tuple) -> bool:
+        with self._lock:
+            return any(entry_key == key for entry_key, _ in self._entries)
+
+    def get_exact(self, key: tuple, text: str) -> types.Content | None:
+        with self._lock:
+            entry = self._entries.get((key, text))
+            if entry is None:
+                return None
+            if time.monotonic() - entry[2] > self.ttl_seconds:
+                del self._entries[(key, text)]
+                return None
+            self._entries.move_to_end((key, text))
+            return entry[1]
+
+    def get_similar(
+        self, key: tuple, embedding: np.ndarray
+    ) -> tuple[types.Content, float] | None:
+        with self._lock:
+            self._expire()
+            candidates: list[tuple[tuple[tuple, str], np.ndarray, types.Content]] = []
+            for entry_key, (entry_embedding, content, _) in self._entries.items():
+                if entry_key[0] == key and entry_embedding is not None:
+                    candidates.append((entry_key, entry_embedding, content))
+            if not candidates:
+                return None
+
+            similarities = np.stack([row for _, row, _ in candidates]) @ embedding
+            best = int(similarities.argmax())
+            if similarities[best] < self.min_similarity:
+                return None
+            entry_key, _, content = candidates[best]
+            self._entries.move_to_end(entry_key)
+            return content, float(similarities[best])
+
+    def put(
+        self,
+        key: tuple,
+        text: str,
+        embedding: np.ndarray | None,
+        content: types.Content,
+    ) -> None:
+        with self._lock:
+            self._entries[(key, text)] = (embedding, content, time.monotonic())
+            self._entries.move_to_end((key, text))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        for entry_key in [
+            entry_key
+            for entry_key, entry in self._entries.items()
+            if now - entry[2] > self.ttl_seconds
+        ]:
+            del self._entries[entry_key]
+
+
+class ResponseCachePlugin(BasePlugin):
+    """
+    Answers a repeated request with the reply of an earlier turn, before the agent
+    tree runs, so a hit makes no model call.
+
+    A reply is reused only for the same agent and the same fingerprint: today's
+    date, today's promotion, the version of the menu index, and whether the user
+    has memories. A new menu ingestion changes the index version and clears the
+    cache. Only the first turn of a session is cached, since later ones may refer
+    to the conversation. Personal and time-dependent requests, and turns that read
+    or write the user memories, are never cached. Specialists called through `AgentTool` share
+    the plugin, so their answers are cached per specialist as well.
+    """
+
+    def __init__(self, name: str = "response_cache"):
+        super().__init__(name)
+        self.cache = ResponseCache(
+            RESPONSE_CACHE_MIN_SIMILARITY,
+            RESPONSE_CACHE_TTL_SECONDS,
+            RESPONSE_CACHE_MAX_ENTRIES,
+        )
+        self.menu_version = MenuVersion(MENU_VERSION_REFRESH_SECONDS)
+        self._index_version: int | None = None
+        self._runs: OrderedDict[str, dict] = OrderedDict()
+        self._stats = {"hits": 0, "similar_hits": 0, "misses": 0, "stores": 0}
+        self._lookups = 0
+
+    async def get_fingerprint(self) -> tuple:
+        today_date = get_today_date()
+        promotion, memories, menu_version = await asyncio.gather(
+            asyncio.to_thread(get_current_promotion, today_date),
+            asyncio.to_thread(memory_store.get, DEFAULT_USER_ID),
+            self.menu_version.get(),
+        )
+        if menu_version != self._index_version:
+            if len(self.cache):
+                logging.info(
+                    f"Menu index version changed to {menu_version}, "
+                    "clearing the response cache"
+                )
+            self.cache.clear()
+            self._index_version = menu_version
+        return (
+            today_date.split(" ")[0],
+            promotion["name"] if promotion else None,
+            menu_version,
+            bool(memories and memories.preferences),
+        )
+
+    async def before_run_callback(
+        self, *, invocation_context: InvocationContext
+    ) -> types.Content | None:
+        if not RESPONSE_CACHE_ENABLED:
+            return None
+        text = normalize_request(get_content_text(invocation_context.user_content))
+        if not is_cacheable(text) or not is_first_turn(invocation_context):
+            return None
+
+        started = time.monotonic()
+        try:
+            key = (invocation_context.agent.name, await self.get_fingerprint())
+            content = self.cache.get_exact(key, text)
+            embedding = None
+            if content is not None:
+                self._record("hits")
+            elif self.cache.has_entries(key):
+                embedding = await embed_request(text)
+                hit = self.cache.get_similar(key, embedding)
+                if hit is not None:
+                    content, similarity = hit
+                    self._record("similar_hits")
+                    logging.info(f"Response cache similarity {similarity:.3f}: {text}")
+        except Exception as e:
+            logging.error(f"An error occurred looking up the response cache: {e}")
+            return None
+
+        if content is not None:
+            logging.info(
+                f"Answered {key[0]} from the response cache in "
+                f"{(time.monotonic() - started) * 1000:.0f}ms: {text}"
+            )
+            return content
+
+        self._record("misses")
+        self._runs[invocation_context.invocation_id] = {
+            "key": key,
+            "text": text,
+            "embedding": embedding,
+            "reply": None,
+        }
+        while len(self._runs) > MAX_PENDING_RUNS:
+            self._runs.popitem(last=False)
+        return None
+
+    async def on_event_callback(
+        self, *, invocation_context: InvocationContext, event: Event
+    ) -> Event | None:
+        run = self._runs.get(invocation_context.invocation_id)
+        if run is None or event.partial:
+            return None
+        if event.error_code or any(
+            call.name in PERSONAL_TOOLS for call in event.get_function_calls()
+        ):
+            self._runs.pop(invocation_context.invocation_id, None)
+        elif event.author != "user" and event.is_final_response():
+            run["reply"] = get_content_text(event.content) or None
+        return None
+
+    async def after_run_callback(
+        self, *, invocation_context: InvocationContext
+    ) -> None:
+        run = self._runs.pop(invocation_context.invocation_id, None)
+        if run is None or run["reply"] is None:
+            return None
+        try:
+            embedding = run["embedding"]
+            if embedding is None:
+                embedding = await embed_request(run["text"])
+        except Exception as e:
+            # The reply is still served to the exact same request.
+            logging.error(f"An error occurred embedding a cached request: {e}")
+        self.cache.put(
+            run["key"],
+            run["text"],
+            embedding,
+            types.Content(role="model", parts=[types.Part(text=run["reply"])]),
+        )
+        self._record("stores")
+        return None
+
+    def stats(self) -> dict:
+        lookups = (
+            self._stats["hits"] + self._stats["similar_hits"] + self._stats["misses"]
+        )
+        return {
+            **self._stats,
+            "hit_rate": (
+                (self._stats["hits"] + self._stats["similar_hits"]) / lookups
+                if lookups
+                else 0.0
+            ),
+            "entries": len(self.cache),
+        }
+
+    def _record(self, stat: str) -> None:
+        self._stats[stat] += 1
+        if stat == "stores":
+            return
+        self._lookups += 1
+        if STATS_LOG_EVERY and self._lookups % STATS_LOG_EVERY == 0:
+            logging.info(f"Response cache stats: {self.stats()}")
@@ -0,0 +1,33 @@
+import os
+import sys
+import types
+from pathlib import Path
+
+from google.adk.agents import LlmAgent
+
+AGENTS_DIR = Path(__file__).resolve().parent.parent / "agents"
+AGENT_PACKAGES = (
+    "creative_director_agent",
+    "head_barista_agent",
+    "market_analyst_agent",
+    "orchestrator_agent",
+)
+
+# Clients created at import point at an emulator, so no test reaches Google Cloud.
+os.environ.setdefault("FIRESTORE_EMULATOR_HOST", "localhost:8686")
+os.environ.setdefault("GOOGLE_CLOUD_PROJECT", "test-project")
+os.environ.setdefault("GOOGLE_API_KEY", "test-key")
+
+# Each agent package builds its agent in `__init__`, which needs the MCP server, the
+# Toolbox and cloud logging. The packages are registered by path instead, with a
+# stand-in agent, so their `tools` modules import without running `__init__`.
+for package in AGENT_PACKAGES:
+    if package not in sys.modules:
+        module = types.ModuleType(package)
+        module.__path__ = [str(AGENTS_DIR / package)]
+        setattr(
+            module,
+            package,
+            LlmAgent(name=package, description=f"Stand-in for the {package}."),
+        )
+        sys.modules[package] = module
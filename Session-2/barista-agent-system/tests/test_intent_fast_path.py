@@ -0,0 +1,85 @@
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from google.genai import types
+from orchestrator_agent.tools import intent_fast_path
+from orchestrator_agent.tools.intent_fast_path import answer_fast_path
+from orchestrator_agent.tools.intent_fast_path import classify_intent
+from orchestrator_agent.tools.intent_fast_path import INTENT_AVAILABILITY
+from orchestrator_agent.tools.intent_fast_path import INTENT_PROMOTION
+
+
+def make_context(text: str, earlier_turns: int = 0) -> SimpleNamespace:
+    """A callback context whose session holds `earlier_turns` user messages."""
+    events = [
+        SimpleNamespace(author="user", invocation_id=f"earlier-{turn}")
+        for turn in range(earlier_turns)
+    ]
+    events.append(SimpleNamespace(author="user", invocation_id="current"))
+    return SimpleNamespace(
+        invocation_id="current",
+        session=SimpleNamespace(events=events),
+        user_content=types.Content(role="user", parts=[types.Part(text=text)]),
+    )
+
+
+@pytest.fixture
+def availability_embeddings(monkeypatch):
+    """Every request embeds right on the availability centroid."""
+    centroids = {
+        intent: np.eye(3, dtype=np.float32)[index]
+        for index, intent in enumerate(intent_fast_path.INTENT_EXAMPLES)
+    }
+
+    async def get_intent_centroids():
+        return centroids
+
+    async def embed_request(text):
+        return centroids[INTENT_AVAILABILITY]
+
+    monkeypatch.setattr(intent_fast_path, "get_intent_centroids", get_intent_centroids)
+    monkeypatch.setattr(intent_fast_path, "embed_request", embed_request)
+
+
+def test_single_request_is_classified(availability_embeddings):
+    intent = asyncio.run(classify_intent("is the latte lux available?"))
+
+    assert intent == INTENT_AVAILABILITY
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "is the latte lux available and how much is it?",
+        "is the latte lux available? how much is it?",
+        "is the latte lux available, what's in it?",
+    ],
+)
+def test_compound_request_is_not_classified(availability_embeddings, text):
+    assert asyncio.run(classify_intent(text)) is None
+
+
+@pytest.fixture
+def promotion_reply(monkeypatch):
+    async def classify_intent(text):
+        return INTENT_PROMOTION
+
+    monkeypatch.setattr(intent_fast_path, "classify_intent", classify_intent)
+    monkeypatch.setitem(
+        intent_fast_path.INTENT_HANDLERS, INTENT_PROMOTION, lambda text: "A promo."
+    )
+
+
+def test_first_turn_is_answered(promotion_reply):
+    reply = asyncio.run(answer_fast_path(make_context("What's today's promotion?")))
+
+    assert reply is not None
+    assert reply.parts[0].text == "A promo."
+
+
+def test_follow_up_turn_is_not_answered(promotion_reply):
+    context = make_context("And what's today's promotion?", earlier_turns=1)
+
+    assert asyncio.run(answer_fast_path(context)) is None
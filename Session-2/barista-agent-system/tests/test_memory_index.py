@@ -0,0 +1,53 @@
+import numpy as np
+from orchestrator_agent.tools.memory_index import encode_embedding
+from orchestrator_agent.tools.memory_index import preference_key
+from orchestrator_agent.tools.memory_index import UserMemories
+
+
+def embeddings_at(similarity: float) -> tuple[list[float], list[float]]:
+    """Returns two unit vectors with the given cosine similarity."""
+    return [1.0, 0.0], [similarity, float(np.sqrt(1.0 - similarity**2))]
+
+
+def make_memories(preferences: list[tuple[str, list[float]]]) -> UserMemories:
+    return UserMemories(
+        [preference for preference, _ in preferences],
+        {
+            preference_key(preference): encode_embedding(embedding)
+            for preference, embedding in preferences
+        },
+    )
+
+
+def test_near_duplicate_preferences_are_kept_by_default():
+    oat, almond = embeddings_at(0.95)
+    memories = make_memories([("likes oat milk", oat), ("likes almond milk", almond)])
+
+    assert memories.compact().preferences == ["likes oat milk", "likes almond milk"]
+
+
+def test_near_duplicate_preferences_are_kept_below_the_threshold():
+    oat, almond = embeddings_at(0.95)
+    memories = make_memories([("likes oat milk", oat), ("likes almond milk", almond)])
+
+    assert memories.compact(0.99).preferences == [
+        "likes oat milk",
+        "likes almond milk",
+    ]
+
+
+def test_preferences_above_the_threshold_keep_the_newest():
+    oat, almond = embeddings_at(0.995)
+    memories = make_memories([("likes oat milk", oat), ("likes almond milk", almond)])
+
+    assert memories.compact(0.99).preferences == ["likes almond milk"]
+
+
+def test_same_words_keep_the_newest():
+    first, second = embeddings_at(0.5)
+    memories = make_memories([("Likes oat milk.", first), ("likes oat milk", second)])
+
+    compacted = memories.compact()
+
+    assert compacted.preferences == ["likes oat milk"]
+    assert set(compacted.embeddings()) == {preference_key("likes oat milk")}
@@ -0,0 +1,85 @@
+import asyncio
+import logging
+from types import SimpleNamespace
+
+import pytest
+from google.genai import types
+from head_barista_agent import head_barista_agent
+from orchestrator_agent.tools import dispatch_tools
+from orchestrator_agent.tools import specialist_router
+from orchestrator_agent.tools.specialist_router import route_to_specialist
+
+
+def make_context(text: str, earlier_turns: int = 0) -> SimpleNamespace:
+    """A callback context whose session holds `earlier_turns` user messages."""
+    events = [
+        SimpleNamespace(author="user", invocation_id=f"earlier-{turn}")
+        for turn in range(earlier_turns)
+    ]
+    events.append(SimpleNamespace(author="user", invocation_id="current"))
+    return SimpleNamespace(
+        invocation_id="current",
+        session=SimpleNamespace(events=events),
+        state={},
+        user_content=types.Content(role="user", parts=[types.Part(text=text)]),
+    )
+
+
+@pytest.fixture
+def routed(monkeypatch):
+    """Every request is routed to the Head Barista; returns the routed requests."""
+    requests = []
+
+    async def route_request(text):
+        requests.append(text)
+        return head_barista_agent.name
+
+    monkeypatch.setattr(specialist_router, "route_request", route_request)
+    monkeypatch.setattr(specialist_router, "ROUTER_DEADLINE_SECONDS", 0.05)
+    return requests
+
+
+def test_answer_is_returned(routed, monkeypatch):
+    async def run_specialist(agent, question, context):
+        return "A Latte Lux is 4.50."
+
+    monkeypatch.setattr(dispatch_tools, "run_specialist", run_specialist)
+
+    reply = asyncio.run(route_to_specialist(make_context("How much is a Latte Lux?")))
+
+    assert reply is not None
+    assert reply.parts[0].text == "A Latte Lux is 4.50."
+
+
+def test_follow_up_turn_is_not_routed(routed):
+    context = make_context("And how much is it?", earlier_turns=1)
+
+    assert asyncio.run(route_to_specialist(context)) is None
+    assert routed == []
+
+
+def test_timeout_falls_back_to_the_orchestrator(routed, monkeypatch, caplog):
+    async def run_specialist(agent, question, context):
+        await asyncio.sleep(1)
+        return "Too late."
+
+    monkeypatch.setattr(dispatch_tools, "run_specialist", run_specialist)
+
+    with caplog.at_level(logging.WARNING):
+        reply = asyncio.run(route_to_specialist(make_context("How much is a Mocha?")))
+
+    assert reply is None
+    assert "falling back to the orchestrator: No answer within 0.05" in caplog.text
+
+
+def test_failure_falls_back_to_the_orchestrator(routed, monkeypatch, caplog):
+    async def run_specialist(agent, question, context):
+        raise RuntimeError("menu server unavailable")
+
+    monkeypatch.setattr(dispatch_tools, "run_specialist", run_specialist)
+
+    with caplog.at_level(logging.WARNING):
+        reply = asyncio.run(route_to_specialist(make_context("How much is a Mocha?")))
+
+    assert reply is None
+    assert "falling back to the orchestrator: menu server unavailable" in caplog.text
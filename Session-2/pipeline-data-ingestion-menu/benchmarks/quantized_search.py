@@ -0,0 +1,123 @@
+"""
+Compares the compact index format (int8 codes, coarse Matryoshka pass and full
+rerank) with an exact float32 cosine search: storage per document, in-memory
+size, search time, recall@k against the exact top-k, and how often the document
+each query was drawn from is found by either search.
+
+    PYTHONPATH=src poetry run python benchmarks/quantized_search.py
+    PYTHONPATH=src poetry run python benchmarks/quantized_search.py --embeddings menu.npy
+
+Without `--embeddings` it uses synthetic vectors whose variance decays along the
+dimensions, like Matryoshka embeddings, with queries drawn near random documents.
+"""
+
+import argparse
+import time
+
+import numpy as np
+from vector_codec import COARSE_DIMENSIONALITY
+from vector_codec import normalize_rows
+from vector_codec import QuantizedMatrix
+from vector_codec import quantize
+from vector_codec import top_k
+
+FIRESTORE_DOUBLE_BYTES = 8
+
+
+def synthetic_embeddings(
+    documents: int, queries: int, dimensionality: int, seed: int
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    decay = 1.0 / np.sqrt(1.0 + np.arange(dimensionality) / 32.0)
+    corpus = rng.standard_normal((documents, dimensionality)) * decay
+    targets = rng.integers(0, documents, size=queries)
+    noise = rng.standard_normal((queries, dimensionality)) * decay
+    return (
+        normalize_rows(corpus).astype(np.float32),
+        normalize_rows(corpus[targets] + 0.8 * noise).astype(np.float32),
+        targets,
+    )
+
+
+def exact_search(
+    corpus: np.ndarray, queries: np.ndarray, k: int
+) -> tuple[np.ndarray, float]:
+    start = time.perf_counter()
+    top, _ = top_k(normalize_rows(queries) @ normalize_rows(corpus).T, k)
+    return top, time.perf_counter() - start
+
+
+def quantized_search(
+    matrix: QuantizedMatrix, queries: np.ndarray, k: int
+) -> tuple[np.ndarray, float]:
+    start = time.perf_counter()
+    top, _ = matrix.search(queries.tolist(), k)
+    return top, time.perf_counter() - start
+
+
+def recall(expected: np.ndarray, found: np.ndarray) -> float:
+    hits = sum(
+        len(set(expected_row) & set(found_row))
+        for expected_row, found_row in zip(expected, found)
+    )
+    return hits / expected.size
+
+
+def hit_rate(targets: np.ndarray, found: np.ndarray) -> float:
+    return float(np.mean([target in row for target, row in zip(targets, found)]))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--embeddings", help="A .npy file with one embedding per row")
+    parser.add_argument("--documents", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dimensionality", type=int, default=768)
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 2, 5, 10])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.embeddings:
+        corpus = normalize_rows(np.load(args.embeddings).astype(np.float32))
+        rng = np.random.default_rng(args.seed)
+        targets = rng.integers(0, len(corpus), size=args.queries)
+        queries = corpus[targets]
+        queries = normalize_rows(
+            queries + 0.02 * rng.standard_normal(queries.shape).astype(np.float32)
+        )
+    else:
+        corpus, queries, targets = synthetic_embeddings(
+            args.documents, args.queries, args.dimensionality, args.seed
+        )
+
+    matrix = QuantizedMatrix.from_rows([quantize(row) for row in corpus])
+    documents, dimensionality = corpus.shape
+
+    print(f"{documents} documents, {len(queries)} queries, {dimensionality} dims")
+    print(
+        "Firestore bytes per document: "
+        f"{dimensionality * FIRESTORE_DOUBLE_BYTES} float embedding, "
+        f"{COARSE_DIMENSIONALITY * FIRESTORE_DOUBLE_BYTES + dimensionality} "
+        "coarse vector + int8 codes"
+    )
+    print(
+        f"In-memory index: {corpus.nbytes} bytes float32, "
+        f"{matrix.nbytes} bytes int8"
+    )
+
+    print(
+        f"{'k':>4} {'recall@k':>9} {'hit exact':>10} {'hit two-stage':>14} "
+        f"{'exact ms':>9} {'two-stage ms':>13}"
+    )
+    for k in args.k:
+        expected, exact_seconds = exact_search(corpus, queries, k)
+        found, quantized_seconds = quantized_search(matrix, queries, k)
+        print(
+            f"{k:>4} {recall(expected, found):>9.4f} "
+            f"{hit_rate(targets, expected):>10.4f} {hit_rate(targets, found):>14.4f} "
+            f"{exact_seconds * 1000:>9.1f} {quantized_seconds * 1000:>13.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
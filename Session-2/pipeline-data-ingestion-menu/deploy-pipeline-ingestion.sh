@@ -19,6 +19,8 @@ gcloud run deploy "${SERVICE_NAME}" \
     --image "${IMAGE_NAME}" \
     --service-account "${AGENT_SERVICE_ACCOUNT}" \
     --update-secrets GOOGLE_API_KEY=GOOGLE_GENAI_API_KEY:latest \
+    --no-cpu-throttling \
+    --min-instances 1 \
     --platform "managed" \
     --region "${REGION}" \
     --allow-unauthenticated \
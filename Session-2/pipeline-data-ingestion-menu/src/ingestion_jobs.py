@@ -0,0 +1,199 @@
+import hashlib
+import logging
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+from google.cloud import firestore
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+def ingestion_job_id(bucket: str, name: str, generation: str) -> str:
+    """
+    Returns the ID of the job that ingests one generation of a Cloud Storage object,
+    so concurrent or redelivered events for the same upload map to the same job.
+    """
+    key = f"{bucket}/{name}#{generation}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def is_claimable(existing: dict | None, now: float, stale_seconds: float) -> bool:
+    """
+    Whether a new job may take over an existing record: there is none, the job
+    failed, or it is still pending or running but was not updated for
+    `stale_seconds`, e.g. because the instance running it died.
+    """
+    if existing is None or existing.get("status") == JOB_FAILED:
+        return True
+    if existing.get("status") in (JOB_PENDING, JOB_RUNNING):
+        updated_at = existing.get("updated_at", existing.get("created_at", 0.0))
+        return now - updated_at > stale_seconds
+    return False
+
+
+class InMemoryJobStore:
+    """
+    Keeps the job records in process memory. It is the local stand-in for the
+    Firestore store, for tests and local runs.
+    """
+
+    def __init__(self):
+        self._jobs: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def claim(
+        self, job_id: str, record: dict, stale_seconds: float
+    ) -> tuple[dict, bool]:
+        with self._lock:
+            existing = self._jobs.get(job_id)
+            if not is_claimable(existing, record["updated_at"], stale_seconds):
+                return dict(existing or record), False
+            attempts = (existing or {}).get("attempts", 0) + 1
+            self._jobs[job_id] = {**record, "attempts": attempts}
+            return dict(self._jobs[job_id]), True
+
+    def update(self, job_id: str, fields: dict) -> None:
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            record = self._jobs.get(job_id)
+            return dict(record) if record else None
+
+
+class FirestoreJobStore:
+    """
+    Keeps the job records in a Firestore collection, so events redelivered to
+    another instance are merged into the job that is already there. A record is
+    claimed in a transaction, so only one instance takes over a failed or stale job.
+    """
+
+    def __init__(self, db: firestore.Client, collection: str):
+        self._db = db
+        self._collection = db.collection(collection)
+
+    def claim(
+        self, job_id: str, record: dict, stale_seconds: float
+    ) -> tuple[dict, bool]:
+        doc_ref = self._collection.document(job_id)
+
+        @firestore.transactional
+        def claim_record(transaction) -> tuple[dict, bool]:
+            snapshot = doc_ref.get(transaction=transaction)
+            existing = snapshot.to_dict() if snapshot.exists else None
+            if not is_claimable(existing, record["updated_at"], stale_seconds):
+                return existing or record, False
+            claimed = {**record, "attempts": (existing or {}).get("attempts", 0) + 1}
+            transaction.set(doc_ref, claimed)
+            return claimed, True
+
+        return claim_record(self._db.transaction())
+
+    def update(self, job_id: str, fields: dict) -> None:
+        self._collection.document(job_id).update(fields)
+
+    def get(self, job_id: str) -> dict | None:
+        doc = self._collection.document(job_id).get()
+        return doc.to_dict() if doc.exists else None
+
+
+class IngestionJobQueue:
+    """
+    Runs menu ingestions on a pool of worker threads. Each Cloud Storage object
+    generation is ingested by a single job, whose status is kept in the job store.
+    A job that failed, or that stayed pending or running for `stale_seconds`
+    without an update, is started again by the next event for the same generation.
+    """
+
+    def __init__(
+        self,
+        store: InMemoryJobStore | FirestoreJobStore,
+        handler: Callable[[str, str, str], dict],
+        max_workers: int,
+        stale_seconds: float,
+    ):
+        self.store = store
+        self._handler = handler
+        self.stale_seconds = stale_seconds
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="ingestion-job"
+        )
+
+    def submit(self, bucket: str, name: str, generation: str) -> tuple[dict, bool]:
+        """
+        Enqueues the ingestion of an object generation, unless a job for it is
+        already pending, running or succeeded.
+
+        Args:
+            bucket (str): The Cloud Storage bucket.
+            name (str): The object name.
+            generation (str): The object generation.
+
+        Returns:
+            tuple[dict, bool]: The job record and whether a new job was started.
+        """
+        job_id = ingestion_job_id(bucket, name, generation)
+        now = time.time()
+        record: dict = {
+            "job_id": job_id,
+            "bucket": bucket,
+            "name": name,
+            "generation": generation,
+            "status": JOB_PENDING,
+            "created_at": now,
+            "updated_at": now,
+        }
+
+        record, claimed = self.store.claim(job_id, record, self.stale_seconds)
+        if not claimed:
+            logging.info(f"Merged event for gs://{bucket}/{name}#{generation}")
+            return record, False
+
+        if record["attempts"] > 1:
+            logging.info(
+                f"Retrying ingestion job {job_id} (attempt {record['attempts']})"
+            )
+        self._executor.submit(self._run, record)
+        return record, True
+
+    def get(self, job_id: str) -> dict | None:
+        return self.store.get(job_id)
+
+    def _run(self, record: dict) -> None:
+        job_id = record["job_id"]
+        now = time.time()
+        self.store.update(
+            job_id, {"status": JOB_RUNNING, "started_at": now, "updated_at": now}
+        )
+        try:
+            summary = self._handler(
+                record["bucket"], record["name"], record["generation"]
+            )
+            now = time.time()
+            self.store.update(
+                job_id,
+                {
+                    "status": JOB_SUCCEEDED,
+                    "summary": summary,
+                    "finished_at": now,
+                    "updated_at": now,
+                },
+            )
+        except Exception as e:
+            logging.error(f"An error occurred in ingestion job {job_id}: {e}")
+            now = time.time()
+            self.store.update(
+                job_id,
+                {
+                    "status": JOB_FAILED,
+                    "error": str(e),
+                    "finished_at": now,
+                    "updated_at": now,
+                },
+            )
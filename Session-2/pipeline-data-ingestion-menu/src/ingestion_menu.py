@@ -1,18 +1,37 @@
+import functools
+import hashlib
 import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+from collections.abc import Iterator
+from concurrent.futures import as_completed
+from concurrent.futures import ThreadPoolExecutor
 
 import google.cloud.logging
+from cloudevents.exceptions import GenericException
 from cloudevents.http import from_http
 from dotenv import load_dotenv
+from embedding_cache import get_cached_embeddings
 from flask import Flask
 from flask import request
 from google import genai
 from google.cloud import firestore
 from google.cloud import storage
-from google.cloud.firestore_v1.vector import Vector
+from google.cloud.firestore_v1.collection import CollectionReference
+from google.cloud.firestore_v1.document import DocumentReference
+from google.genai import errors
 from google.genai import types
+from ingestion_jobs import FirestoreJobStore
+from ingestion_jobs import IngestionJobQueue
+from ingestion_jobs import InMemoryJobStore
 from langchain_community.document_loaders import TextLoader
 from langchain_core.documents import Document
 from langchain_text_splitters import MarkdownHeaderTextSplitter
+from vector_codec import encode_embedding
+from vector_codec import INDEX_FORMAT
 
 
 client = google.cloud.logging.Client()
@@ -24,8 +43,25 @@ app = Flask(__name__)
 
 # Constants
 MENU_FIRESTORE_COLLECTION = "menu"
+MENU_INDEX_COLLECTION = "menu_index"
+MENU_INDEX_STATE_DOCUMENT = "state"
 DATABASE_NAME = "embeddings"
 GEMINI_MODEL_EMBEDDING = "gemini-embedding-001"
+EMBEDDING_TASK_TYPE = "SEMANTIC_SIMILARITY"
+EMBEDDING_DIMENSIONALITY = 768
+EMBEDDING_BATCH_SIZE = 32
+MAX_CONCURRENT_EMBEDDING_BATCHES = 4
+QUOTA_EXCEEDED_CODE = 429
+MAX_QUOTA_RETRIES = 5
+QUOTA_BACKOFF_SECONDS = 2.0
+WRITE_FLUSH_SIZE = 100
+WRITE_FLUSH_INTERVAL_SECONDS = 1.0
+MAX_WRITE_ATTEMPTS = 5
+STORAGE_FINALIZED_EVENT = "google.cloud.storage.object.v1.finalized"
+INGESTION_JOBS_COLLECTION = "ingestion_jobs"
+INGESTION_JOB_STORE = os.getenv("INGESTION_JOB_STORE", "firestore")
+INGESTION_MAX_WORKERS = int(os.getenv("INGESTION_MAX_WORKERS", "2"))
+INGESTION_JOB_STALE_SECONDS = float(os.getenv("INGESTION_JOB_STALE_SECONDS", "1800"))
 
 
 def chunking(file_path: str) -> list[Document]:
@@ -40,82 +76,407 @@ def chunking(file_path: str) -> list[Document]:
     return chunks
 
 
-def create_embeddings(chunk: Document) -> tuple:
-    logging.info("creating embeddings")
-    try:
-        text_content = f"{chunk.metadata.get('MenuCategory')} - {chunk.page_content}"
+def chunk_text_content(chunk: Document) -> str:
+    return f"{chunk.metadata.get('MenuCategory')} - {chunk.page_content}"
+
+
+def chunk_id(chunk: Document) -> str:
+    """
+    Returns a stable document ID for a chunk, hashed from its `MenuCategory` and
+    content, so an unchanged chunk always maps to the same Firestore document.
+    """
+    key = f"{chunk.metadata.get('MenuCategory')}\n{chunk.page_content}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+@functools.cache
+def get_genai_client() -> genai.Client:
+    return genai.Client()
+
+
+def embed_batch(texts: list[str], attempt: int = 0) -> list[list[float]]:
+    """
+    Embeds a batch of texts with a single multi-content `embed_content` request.
+
+    When the API answers with a quota error the batch is split in half and each
+    half is retried on its own; a single text is retried with exponential backoff.
 
-        client = genai.Client()
-        result = client.models.embed_content(
+    Args:
+        texts (list[str]): The texts to embed.
+        attempt (int): The retry attempt for a single text, used for the backoff.
+
+    Returns:
+        list[list[float]]: One embedding per text, in the same order as `texts`.
+    """
+    try:
+        result = get_genai_client().models.embed_content(
             model=GEMINI_MODEL_EMBEDDING,
-            contents=text_content,
+            contents=texts,
             config=types.EmbedContentConfig(
-                task_type="SEMANTIC_SIMILARITY",
-                output_dimensionality=768,
+                task_type=EMBEDDING_TASK_TYPE,
+                output_dimensionality=EMBEDDING_DIMENSIONALITY,
             ),
         )
+        return [embedding.values for embedding in result.embeddings]
+    except errors.APIError as e:
+        if e.code != QUOTA_EXCEEDED_CODE:
+            raise e
+
+        if len(texts) > 1:
+            middle = len(texts) // 2
+            logging.warning(
+                f"Quota exceeded embedding {len(texts)} chunks, splitting the batch"
+            )
+            return embed_batch(texts[:middle]) + embed_batch(texts[middle:])
 
-        return result, text_content
+        if attempt >= MAX_QUOTA_RETRIES:
+            raise e
+
+        delay = QUOTA_BACKOFF_SECONDS * 2**attempt
+        logging.warning(f"Quota exceeded embedding a chunk, retrying in {delay}s")
+        time.sleep(delay)
+        return embed_batch(texts, attempt + 1)
+
+
+def create_embeddings(
+    chunks: list[Document],
+) -> Iterator[list[tuple[Document, list[float]]]]:
+    """
+    Creates the embeddings of the chunks in fixed-size batches, running a bounded
+    number of batches at once.
+
+    Args:
+        chunks (list[Document]): The chunks to embed.
+
+    Yields:
+        list[tuple[Document, list[float]]]: The (chunk, embedding) pairs of each
+        batch, as soon as the batch is done.
+    """
+    logging.info("creating embeddings")
+    batches = [
+        chunks[start : start + EMBEDDING_BATCH_SIZE]
+        for start in range(0, len(chunks), EMBEDDING_BATCH_SIZE)
+    ]
+
+    try:
+        with ThreadPoolExecutor(
+            max_workers=MAX_CONCURRENT_EMBEDDING_BATCHES
+        ) as executor:
+            futures = {
+                executor.submit(
+                    get_cached_embeddings,
+                    [chunk_text_content(chunk) for chunk in batch],
+                    embed_batch,
+                    GEMINI_MODEL_EMBEDDING,
+                    EMBEDDING_TASK_TYPE,
+                    EMBEDDING_DIMENSIONALITY,
+                ): batch
+                for batch in batches
+            }
+            for future in as_completed(futures):
+                yield list(zip(futures[future], future.result()))
     except Exception as e:
         logging.error(f"An error occurred in create_embeddings: {e}")
         raise e
 
 
-def save_chunks_embeddings(chunks: list[Document]) -> None:
-    logging.info("embeddings created and saved to Firestore")
+class FirestoreWriteStage:
+    """
+    Writes menu documents to Firestore from a background thread using a `BulkWriter`,
+    so write latency does not add up with the embedding calls.
+
+    Pending writes are flushed every `WRITE_FLUSH_SIZE` documents or every
+    `WRITE_FLUSH_INTERVAL_SECONDS`, whichever comes first. Documents that still fail
+    after `MAX_WRITE_ATTEMPTS` are reported instead of stopping the ingest.
+    """
+
+    _STOP = object()
+
+    def __init__(self, db: firestore.Client):
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.written = 0
+        self.failures: list[dict] = []
+
+        self._bulk_writer = db.bulk_writer()
+        self._bulk_writer.on_write_result(self._on_write_result)
+        self._bulk_writer.on_write_error(self._on_write_error)
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def set(self, doc_ref: DocumentReference, data: dict) -> None:
+        self._queue.put((doc_ref, data))
+
+    def delete(self, doc_ref: DocumentReference) -> None:
+        self._queue.put((doc_ref, None))
+
+    def close(self) -> dict:
+        """
+        Flushes the pending writes and stops the stage.
+
+        Returns:
+            dict: The number of written or deleted documents and the failed ones.
+        """
+        self._queue.put(self._STOP)
+        self._thread.join()
+        return {"written": self.written, "failed": self.failures}
+
+    def _run(self) -> None:
+        pending = 0
+        last_flush = time.monotonic()
+
+        while True:
+            elapsed = time.monotonic() - last_flush
+            try:
+                item = self._queue.get(
+                    timeout=max(0.0, WRITE_FLUSH_INTERVAL_SECONDS - elapsed)
+                )
+            except queue.Empty:
+                item = None
+
+            if item is self._STOP:
+                break
+
+            if item is not None:
+                doc_ref, data = item
+                try:
+                    if data is None:
+                        self._bulk_writer.delete(doc_ref)
+                    else:
+                        self._bulk_writer.set(doc_ref, data)
+                    pending += 1
+                except Exception as e:
+                    self._record_failure(doc_ref.id, None, str(e))
+
+            elapsed = time.monotonic() - last_flush
+            if pending >= WRITE_FLUSH_SIZE or elapsed >= WRITE_FLUSH_INTERVAL_SECONDS:
+                if pending:
+                    self._flush()
+                pending = 0
+                last_flush = time.monotonic()
+
+        self._flush()
+        self._bulk_writer.close()
+
+    def _flush(self) -> None:
+        try:
+            self._bulk_writer.flush()
+        except Exception as e:
+            logging.error(f"An error occurred flushing the Firestore writes: {e}")
+
+    def _on_write_result(self, reference, result, bulk_writer) -> None:
+        with self._lock:
+            self.written += 1
+
+    def _on_write_error(self, failure, bulk_writer) -> bool:
+        if failure.attempts < MAX_WRITE_ATTEMPTS:
+            return True
+
+        self._record_failure(
+            failure.operation.reference.id, failure.code, failure.message
+        )
+        return False
+
+    def _record_failure(self, document_id: str, code: int | None, message: str):
+        logging.error(f"Failed to write menu document {document_id}: {message}")
+        with self._lock:
+            self.failures.append(
+                {"document_id": document_id, "code": code, "error": message}
+            )
+
+
+def get_indexed_chunks(menu_collection: CollectionReference) -> dict[str, dict]:
+    """
+    Returns the IDs of the documents already stored in the menu collection, mapped
+    to their `menu_category` and `index_format`.
+    """
+    return {
+        doc.id: doc.to_dict() or {}
+        for doc in menu_collection.select(["menu_category", "index_format"]).stream()
+    }
+
+
+def save_chunks_embeddings(chunks: list[Document]) -> dict:
+    """
+    Incrementally syncs the menu collection with the chunks. Only new or changed
+    chunks are embedded and written, documents whose chunk is no longer in the menu
+    are deleted, and documents stored in an older index format are rewritten.
+    Embedded chunks are written on their own thread while the next batches are still
+    being embedded.
+
+    Args:
+        chunks (list[Document]): The chunks of the menu file.
+
+    Returns:
+        dict: A summary of the diff: the added, changed and deleted menu categories,
+        the number of unchanged, embedded, reformatted and removed chunks, the number
+        of written or deleted documents and the failed ones.
+    """
     db = firestore.Client(database=DATABASE_NAME)
+    menu_collection = db.collection(MENU_FIRESTORE_COLLECTION)
+
+    menu_chunks = {chunk_id(chunk): chunk for chunk in chunks}
+    indexed_chunks = get_indexed_chunks(menu_collection)
+
+    new_chunks = [
+        chunk for doc_id, chunk in menu_chunks.items() if doc_id not in indexed_chunks
+    ]
+    outdated_chunks = [
+        chunk
+        for doc_id, chunk in menu_chunks.items()
+        if doc_id in indexed_chunks
+        and indexed_chunks[doc_id].get("index_format") != INDEX_FORMAT
+    ]
+    stale_ids = [doc_id for doc_id in indexed_chunks if doc_id not in menu_chunks]
+    unchanged = len(menu_chunks) - len(new_chunks) - len(outdated_chunks)
+
+    new_categories = {chunk.metadata.get("MenuCategory", "") for chunk in new_chunks}
+    stale_categories = {
+        indexed_chunks[doc_id].get("menu_category", "") for doc_id in stale_ids
+    }
+    logging.info(
+        f"menu diff: {len(new_chunks)} new, {len(stale_ids)} stale, "
+        f"{len(outdated_chunks)} outdated, {unchanged} unchanged chunks"
+    )
+
+    write_stage = FirestoreWriteStage(db)
     try:
-        for chunk in chunks:
-            result, text_content = create_embeddings(chunk)
-
-            doc_ref = db.collection(MENU_FIRESTORE_COLLECTION).document()
-            doc_ref.set(
-                {
-                    "text_content": text_content,
-                    "embedding": Vector(result.embeddings[0].values),
-                    "timestamp": firestore.SERVER_TIMESTAMP,
-                }
-            )
+        for doc_id in stale_ids:
+            write_stage.delete(menu_collection.document(doc_id))
+
+        for batch in create_embeddings(new_chunks + outdated_chunks):
+            for chunk, embedding in batch:
+                write_stage.set(
+                    menu_collection.document(chunk_id(chunk)),
+                    {
+                        "text_content": chunk_text_content(chunk),
+                        "menu_category": chunk.metadata.get("MenuCategory", ""),
+                        **encode_embedding(embedding),
+                        "timestamp": firestore.SERVER_TIMESTAMP,
+                    },
+                )
 
     except Exception as e:
         logging.error(f"An error occurred in save_chunks_embeddings: {e}")
         raise e
+    finally:
+        report = write_stage.close()
+
+    if report["written"]:
+        db.collection(MENU_INDEX_COLLECTION).document(MENU_INDEX_STATE_DOCUMENT).set(
+            {
+                "version": firestore.Increment(1),
+                "timestamp": firestore.SERVER_TIMESTAMP,
+            },
+            merge=True,
+        )
+
+    summary = {
+        "added": sorted(new_categories - stale_categories),
+        "changed": sorted(new_categories & stale_categories),
+        "deleted": sorted(stale_categories - new_categories - {""}),
+        "unchanged": unchanged,
+        "embedded": len(new_chunks) + len(outdated_chunks),
+        "reformatted": len(outdated_chunks),
+        "removed": len(stale_ids),
+        **report,
+    }
+    logging.info(f"menu synced to Firestore: {summary}")
+    return summary
 
 
 # create a function that receive a path file and chunking a file using langchain, create embeddings using gemini and save the embedddings in firestore
 
 
-def ingestion_menu(file_path: str) -> None:
+def ingestion_menu(file_path: str) -> dict:
     """
     Ingests a menu file by chunking it, creating embeddings using Gemini, and saving them to Firestore.
+    Only the chunks that changed since the last ingestion are embedded again.
 
     Args:
         file_path (str): The path to the menu file.
+
+    Returns:
+        dict: A summary of the changes applied to the menu collection.
     """
     chunking_menu = chunking(file_path)
-    save_chunks_embeddings(chunking_menu)
+    return save_chunks_embeddings(chunking_menu)
+
+
+def ingest_uploaded_file(bucket: str, file_name: str, generation: str) -> dict:
+    """
+    Downloads one generation of an uploaded menu file and ingests it.
+
+    Args:
+        bucket (str): The Cloud Storage bucket.
+        file_name (str): The object name.
+        generation (str): The object generation.
+
+    Returns:
+        dict: A summary of the changes applied to the menu collection.
+    """
+    storage_client = storage.Client()
+    blob = storage_client.bucket(bucket).blob(file_name, generation=int(generation))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = os.path.join(tmp_dir, os.path.basename(file_name))
+        blob.download_to_filename(file_path)
+        logging.info(f"File downloaded to {file_path}")
+        return ingestion_menu(file_path)
+
+
+def create_job_store() -> InMemoryJobStore | FirestoreJobStore:
+    if INGESTION_JOB_STORE == "memory":
+        return InMemoryJobStore()
+    return FirestoreJobStore(
+        firestore.Client(database=DATABASE_NAME), INGESTION_JOBS_COLLECTION
+    )
+
+
+job_queue = IngestionJobQueue(
+    create_job_store(),
+    ingest_uploaded_file,
+    INGESTION_MAX_WORKERS,
+    INGESTION_JOB_STALE_SECONDS,
+)
 
 
 @app.route("/pipeline", methods=["POST"])
 def index():
     logging.info("A new file has been uploaded to the Cloud Storage bucket")
-    event = from_http(request.headers, request.data)
-    event_data = event.data
+    try:
+        event = from_http(request.headers, request.data)
+    except GenericException as e:
+        logging.error(f"Invalid CloudEvent: {e}")
+        return ({"error": "Invalid CloudEvent"}, 400)
+
+    if event["type"] != STORAGE_FINALIZED_EVENT:
+        return ({"error": f"Unsupported event type: {event['type']}"}, 400)
 
+    event_data = event.data or {}
     bucket = event_data.get("bucket")
     file_name = event_data.get("name")
-    file_path = f"/tmp/{file_name}"
-    logging.info(f"Bucket: {bucket}, File name: {file_name}, File path: {file_path}")
+    generation = event_data.get("generation")
+    if not bucket or not file_name or not generation:
+        return ({"error": "The event must include bucket, name and generation"}, 400)
 
-    storage_client = storage.Client()
-    bucket_gcs = storage_client.bucket(bucket)
-    blob = bucket_gcs.blob(file_name)
-    blob.download_to_filename(file_path)
-    logging.info(f"File downloaded to {file_path}")
+    logging.info(f"Bucket: {bucket}, File name: {file_name}, Generation: {generation}")
+    job, created = job_queue.submit(bucket, file_name, str(generation))
+
+    return (
+        {**job, "merged": not created},
+        202,
+        {"Location": f"/jobs/{job['job_id']}"},
+    )
 
-    ingestion_menu(file_path)
 
-    return (f"Detected change in Cloud Storage bucket: {bucket}", 200)
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        return ({"error": f"Job {job_id} not found"}, 404)
+    return (job, 200)
 
 
 if __name__ == "__main__":
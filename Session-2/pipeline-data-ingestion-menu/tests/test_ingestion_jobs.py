@@ -0,0 +1,188 @@
+import importlib
+import threading
+import time
+from unittest import mock
+
+import google.cloud.logging
+import pytest
+from ingestion_jobs import ingestion_job_id
+from ingestion_jobs import IngestionJobQueue
+from ingestion_jobs import InMemoryJobStore
+from ingestion_jobs import JOB_FAILED
+from ingestion_jobs import JOB_RUNNING
+from ingestion_jobs import JOB_SUCCEEDED
+
+STALE_SECONDS = 60.0
+SUMMARY = {"added": ["Classic Brews"], "written": 1, "failed": []}
+
+
+def wait_for_status(get_job, job_id: str, *statuses: str) -> dict:
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        job = get_job(job_id)
+        if job and job["status"] in statuses:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"Job {job_id} never reached {statuses}")
+
+
+def make_queue(handler) -> IngestionJobQueue:
+    return IngestionJobQueue(InMemoryJobStore(), handler, 2, STALE_SECONDS)
+
+
+def test_same_generation_is_ingested_once():
+    release = threading.Event()
+    calls = []
+
+    def handler(bucket, name, generation):
+        calls.append((bucket, name, generation))
+        release.wait(5)
+        return SUMMARY
+
+    queue = make_queue(handler)
+    job, created = queue.submit("menus", "menu.md", "1")
+    merged, merged_created = queue.submit("menus", "menu.md", "1")
+    release.set()
+
+    assert created and not merged_created
+    assert merged["job_id"] == job["job_id"]
+    wait_for_status(queue.get, job["job_id"], JOB_SUCCEEDED)
+    queue.submit("menus", "menu.md", "1")
+    assert calls == [("menus", "menu.md", "1")]
+
+
+def test_new_generation_is_a_new_job():
+    queue = make_queue(lambda bucket, name, generation: SUMMARY)
+    first, _ = queue.submit("menus", "menu.md", "1")
+    second, created = queue.submit("menus", "menu.md", "2")
+
+    assert created
+    assert first["job_id"] != second["job_id"]
+
+
+def test_failed_job_is_retried():
+    attempts = []
+
+    def handler(bucket, name, generation):
+        attempts.append(generation)
+        if len(attempts) == 1:
+            raise RuntimeError("quota exceeded")
+        return SUMMARY
+
+    queue = make_queue(handler)
+    job, _ = queue.submit("menus", "menu.md", "1")
+    failed = wait_for_status(queue.get, job["job_id"], JOB_FAILED)
+    assert failed["error"] == "quota exceeded"
+
+    retried, created = queue.submit("menus", "menu.md", "1")
+    assert created
+    assert retried["attempts"] == 2
+    succeeded = wait_for_status(queue.get, job["job_id"], JOB_SUCCEEDED)
+    assert succeeded["summary"] == SUMMARY
+    assert "error" not in succeeded
+
+
+def test_stale_running_job_is_taken_over():
+    store = InMemoryJobStore()
+    job_id = ingestion_job_id("menus", "menu.md", "1")
+    stale_at = time.time() - STALE_SECONDS - 1
+    store.claim(
+        job_id,
+        {"job_id": job_id, "status": JOB_RUNNING, "updated_at": stale_at},
+        STALE_SECONDS,
+    )
+
+    queue = IngestionJobQueue(
+        store, lambda bucket, name, generation: SUMMARY, 1, STALE_SECONDS
+    )
+    job, created = queue.submit("menus", "menu.md", "1")
+
+    assert created
+    assert job["attempts"] == 2
+    wait_for_status(queue.get, job_id, JOB_SUCCEEDED)
+
+
+def test_running_job_within_timeout_is_merged():
+    store = InMemoryJobStore()
+    job_id = ingestion_job_id("menus", "menu.md", "1")
+    store.claim(
+        job_id,
+        {"job_id": job_id, "status": JOB_RUNNING, "updated_at": time.time()},
+        STALE_SECONDS,
+    )
+
+    queue = IngestionJobQueue(
+        store, lambda bucket, name, generation: SUMMARY, 1, STALE_SECONDS
+    )
+    job, created = queue.submit("menus", "menu.md", "1")
+
+    assert not created
+    assert job["status"] == JOB_RUNNING
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("INGESTION_JOB_STORE", "memory")
+    monkeypatch.setattr(google.cloud.logging, "Client", mock.MagicMock())
+    ingestion_menu = importlib.import_module("ingestion_menu")
+    monkeypatch.setattr(
+        ingestion_menu,
+        "job_queue",
+        make_queue(lambda bucket, name, generation: SUMMARY),
+    )
+    return ingestion_menu.app.test_client()
+
+
+def post_storage_event(client, generation: str = "1"):
+    return client.post(
+        "/pipeline",
+        json={"bucket": "menus", "name": "menu.md", "generation": generation},
+        headers={
+            "ce-id": f"event-{generation}",
+            "ce-source": "//storage.googleapis.com/projects/_/buckets/menus",
+            "ce-type": "google.cloud.storage.object.v1.finalized",
+            "ce-specversion": "1.0",
+        },
+    )
+
+
+def test_pipeline_answers_202_and_job_is_polled(client):
+    response = post_storage_event(client)
+
+    assert response.status_code == 202
+    job = response.get_json()
+    assert response.headers["Location"] == f"/jobs/{job['job_id']}"
+    assert not job["merged"]
+
+    def get_job(job_id):
+        return client.get(f"/jobs/{job_id}").get_json()
+
+    finished = wait_for_status(get_job, job["job_id"], JOB_SUCCEEDED)
+    assert finished["summary"] == SUMMARY
+
+
+def test_pipeline_merges_redelivered_event(client):
+    first = post_storage_event(client).get_json()
+    second = post_storage_event(client).get_json()
+
+    assert second["job_id"] == first["job_id"]
+    assert second["merged"]
+
+
+def test_pipeline_rejects_event_without_generation(client):
+    response = client.post(
+        "/pipeline",
+        json={"bucket": "menus", "name": "menu.md"},
+        headers={
+            "ce-id": "event",
+            "ce-source": "//storage.googleapis.com/projects/_/buckets/menus",
+            "ce-type": "google.cloud.storage.object.v1.finalized",
+            "ce-specversion": "1.0",
+        },
+    )
+
+    assert response.status_code == 400
+
+
+def test_unknown_job_is_not_found(client):
+    assert client.get("/jobs/unknown").status_code == 404